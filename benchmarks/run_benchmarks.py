@@ -0,0 +1,292 @@
+"""
+Benchmarks for crossword generation and the code it depends on.
+
+Run from the root of the repository:
+
+    python -m benchmarks.run_benchmarks [--quick] [--output results.json]
+                                        [--baseline old.json]
+
+Every case runs in a fresh worker process, so that its peak resident set
+size can be measured separately. The results are written as json: one
+entry per case, with its parameters, p50/p95/p99 latency in milliseconds,
+operations per second and peak RSS in kilobytes. Generation cases also
+record the median and minimum fill ratio and placed word count of their
+crosswords, so that a change which speeds up generation by producing
+sparser grids shows up next to its latency. If a baseline results file is
+supplied, any case whose p50 latency has grown by more than the tolerance,
+or whose median fill ratio or word count has fallen by more than
+QUALITY_TOLERANCE, is reported, and the script exits with status 1.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import statistics
+import string
+import sys
+import tempfile
+import time
+
+from run import build_dictionary_and_length_map
+from source.compiled_dictionary import write_compiled_dictionary
+from source.crossword_generator import Crossword
+from source.word_index import WordIndex
+
+GRID_SIZES = [7, 13, 25, 50]
+DICTIONARY_SCALES = [0.25, 1, 10, 100]
+ENGINES = ["greedy", "backtracking"]
+SEEDS = 20
+QUICK_GRID_SIZES = [7, 13]
+QUICK_DICTIONARY_SCALES = [0.25, 1, 10]
+QUICK_SEEDS = 5
+MATCH_QUERIES = 2000
+DEFAULT_TOLERANCE = 0.25
+QUALITY_TOLERANCE = 0.05
+QUALITY_MEASURES = ['fill_ratio', 'placed_words']
+
+
+def scaled_dictionary(scale, seed=0):
+    """Returns a dictionary scaled from crossword_dictionary.json. A scale
+       below 1 keeps a random subset of the words; a scale above 1 adds
+       synthetic words, made by changing letters of real words, with
+       frequencies drawn from the real ones"""
+    (word_dict, _) = build_dictionary_and_length_map(compiled_path=None)
+    rng = random.Random(seed)
+    words = sorted(word_dict)
+    target = max(1, int(len(words) * scale))
+    if target <= len(words):
+        return {word: word_dict[word] for word in rng.sample(words, target)}
+
+    scaled = dict(word_dict)
+    frequencies = [entry[0] for entry in word_dict.values()]
+    while len(scaled) < target:
+        letters = list(rng.choice(words))
+        for _ in range(rng.randint(1, 2)):
+            letters[rng.randrange(len(letters))] = \
+                rng.choice(string.ascii_lowercase)
+        word = ''.join(letters)
+        if word not in scaled:
+            scaled[word] = [rng.choice(frequencies),
+                            [f"A synthetic word, {word}."]]
+    return scaled
+
+
+def length_map(word_dict):
+    """Builds the map of words keyed by length used by the generator, most
+       frequent first"""
+    word_length_map = {}
+    for word in word_dict:
+        word_length_map.setdefault(len(word), []).append(word)
+    for words in word_length_map.values():
+        words.sort(key=lambda word: word_dict[word][0], reverse=True)
+    return word_length_map
+
+
+def bench_load(case):
+    """Times loading the dictionary through build_dictionary_and_length_map,
+       from json or from the compiled file"""
+    word_dict = scaled_dictionary(case['scale'])
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, 'dictionary.json')
+        compiled_path = os.path.join(directory, 'dictionary.bin')
+        with open(json_path, 'w', encoding='utf-8') as outfile:
+            json.dump(word_dict, outfile, indent=4)
+        write_compiled_dictionary(word_dict, compiled_path,
+                                  source_path=json_path)
+        if case['format'] == 'json':
+            compiled_path = None
+        del word_dict
+
+        timings = []
+        for _ in range(case['repeats']):
+            start = time.perf_counter()
+            build_dictionary_and_length_map(json_path, compiled_path)
+            timings.append(time.perf_counter() - start)
+    return timings, {}
+
+
+def bench_find_matches(case):
+    """Times WordIndex.find_matches on patterns made by blanking out
+       letters of random dictionary words"""
+    word_dict = scaled_dictionary(case['scale'])
+    word_index = WordIndex(length_map(word_dict), word_dict)
+    rng = random.Random(case['seed'])
+    words = sorted(word_dict)
+    patterns = []
+    for _ in range(MATCH_QUERIES):
+        word = rng.choice(words)
+        patterns.append([char if rng.random() < 0.4 else '_'
+                         for char in word])
+
+    timings = []
+    for pattern in patterns:
+        start = time.perf_counter()
+        word_index.find_matches(pattern)
+        timings.append(time.perf_counter() - start)
+    return timings, {}
+
+
+def bench_generation(case):
+    """Times generating headless crosswords, one per seed, and records how
+       full each crossword is and how many words it holds"""
+    word_dict = scaled_dictionary(case['scale'])
+    word_length_map = length_map(word_dict)
+    word_index = WordIndex(word_length_map, word_dict)
+    timings = []
+    quality = {measure: [] for measure in QUALITY_MEASURES}
+    for seed in range(case['seeds']):
+        start = time.perf_counter()
+        crossword = Crossword(case['size'], case['size'], word_length_map,
+                              word_dict, user_present=False, headless=True,
+                              seed=seed, word_index=word_index,
+                              engine=case['engine'])
+        timings.append(time.perf_counter() - start)
+        quality['fill_ratio'].append(crossword.fill_ratio())
+        quality['placed_words'].append(len(crossword.placed_words))
+    return timings, quality
+
+
+def bench_reindex_clues(case):
+    """Times reindex_clues on crosswords generated from each seed"""
+    word_dict = scaled_dictionary(case['scale'])
+    word_length_map = length_map(word_dict)
+    word_index = WordIndex(word_length_map, word_dict)
+    timings = []
+    for seed in range(case['seeds']):
+        crossword = Crossword(case['size'], case['size'], word_length_map,
+                              word_dict, user_present=False, headless=True,
+                              seed=seed, word_index=word_index)
+        start = time.perf_counter()
+        crossword.reindex_clues()
+        timings.append(time.perf_counter() - start)
+    return timings, {}
+
+
+BENCHMARKS = {'load_dictionary': bench_load,
+              'find_matches': bench_find_matches,
+              'generation': bench_generation,
+              'reindex_clues': bench_reindex_clues}
+
+
+def build_cases(quick=False):
+    """Returns the list of benchmark cases to run"""
+    sizes = QUICK_GRID_SIZES if quick else GRID_SIZES
+    scales = QUICK_DICTIONARY_SCALES if quick else DICTIONARY_SCALES
+    seeds = QUICK_SEEDS if quick else SEEDS
+    cases = []
+    for scale in scales:
+        for dictionary_format in ['json', 'compiled']:
+            cases.append({'benchmark': 'load_dictionary', 'scale': scale,
+                          'format': dictionary_format, 'repeats': seeds})
+        cases.append({'benchmark': 'find_matches', 'scale': scale,
+                      'seed': 0})
+        for size in sizes:
+            for engine in ENGINES:
+                cases.append({'benchmark': 'generation', 'scale': scale,
+                              'size': size, 'engine': engine,
+                              'seeds': seeds})
+            cases.append({'benchmark': 'reindex_clues', 'scale': scale,
+                          'size': size, 'seeds': seeds})
+    return cases
+
+
+def run_case(case):
+    """Runs one case, in its own worker process, and summarises it"""
+    (timings, quality) = BENCHMARKS[case['benchmark']](case)
+    milliseconds = sorted(timing * 1000 for timing in timings)
+    if len(milliseconds) > 1:
+        percentiles = statistics.quantiles(milliseconds, n=100,
+                                           method='inclusive')
+    else:
+        percentiles = milliseconds * 99
+
+    # ru_maxrss is in kilobytes on Linux, but in bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak_rss //= 1024
+
+    result = dict(case)
+    result.update({'samples': len(milliseconds),
+                   'p50_ms': percentiles[49],
+                   'p95_ms': percentiles[94],
+                   'p99_ms': percentiles[98],
+                   'ops_per_sec': len(timings) / sum(timings),
+                   'peak_rss_kb': peak_rss})
+    for measure, values in quality.items():
+        result[f'{measure}_median'] = statistics.median(values)
+        result[f'{measure}_min'] = min(values)
+    return result
+
+
+def case_key(result):
+    """Identifies a case by its parameters, for comparison with a
+       baseline"""
+    parameters = {key: value for key, value in result.items()
+                  if key in ('benchmark', 'scale', 'format', 'seed', 'size',
+                             'engine')}
+    return json.dumps(parameters, sort_keys=True)
+
+
+def find_regressions(results, baseline, tolerance):
+    """Returns a message for each case that is slower than its baseline by
+       more than the tolerance, or whose crosswords are emptier than its
+       baseline's by more than QUALITY_TOLERANCE"""
+    previous = {case_key(result): result for result in baseline}
+    messages = []
+    for result in results:
+        old = previous.get(case_key(result))
+        if old is None:
+            continue
+        if result['p50_ms'] > old['p50_ms'] * (1 + tolerance):
+            messages.append(f"{case_key(result)}: p50 {old['p50_ms']:.3f}ms"
+                            f" -> {result['p50_ms']:.3f}ms")
+        for measure in QUALITY_MEASURES:
+            key = f'{measure}_median'
+            if key in result and key in old and \
+                    result[key] < old[key] * (1 - QUALITY_TOLERANCE):
+                messages.append(f"{case_key(result)}: median {measure} "
+                                f"{old[key]:.3f} -> {result[key]:.3f}")
+    return messages
+
+
+def main():
+    """Runs the benchmarks and writes the results"""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--quick', action='store_true',
+                        help='run a smaller set of cases')
+    parser.add_argument('--output', help='write the results to this file')
+    parser.add_argument('--baseline',
+                        help='compare against an earlier results file')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed fractional growth in p50 latency')
+    args = parser.parse_args()
+
+    results = []
+    context = multiprocessing.get_context('fork')
+    for case in build_cases(args.quick):
+        with context.Pool(1) as pool:
+            result = pool.apply(run_case, (case,))
+        results.append(result)
+        print(json.dumps(result), file=sys.stderr)
+
+    output = json.dumps(results, indent=4)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as outfile:
+            outfile.write(output)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as infile:
+            baseline = json.load(infile)
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for message in regressions:
+            print(f"Regression: {message}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,42 +1,103 @@
 const Pty = require('node-pty');
 const fs = require('fs');
+const net = require('net');
+const { spawn } = require('child_process');
+
+// Unix socket of the long-lived puzzle server (server.py), which hands
+// each session a crossword that has already been generated.
+const PUZZLE_SOCKET = process.env.PUZZLE_SOCKET || '/tmp/crossword-generator.sock';
 
 exports.install = function () {
 
     ROUTE('/');
     WEBSOCKET('/', socket, ['raw']);
 
+    startPuzzleServer();
+
 };
 
-function socket() {
+function startPuzzleServer() {
 
-    this.encodedecode = false;
-    this.autodestroy();
+    const server = spawn('python3', ['server.py', PUZZLE_SOCKET], {
+        cwd: process.env.PWD,
+        env: process.env,
+        stdio: 'inherit'
+    });
 
-    this.on('open', function (client) {
+    server.on('exit', function (code, signal) {
+        console.log("Puzzle server exited, sessions will start run.py");
+    });
+}
 
-        // Spawn terminal
-        client.tty = Pty.spawn('python3', ['run.py'], {
-            name: 'xterm-color',
-            cols: 80,
-            rows: 24,
-            cwd: process.env.PWD,
-            env: process.env
-        });
+function connectToPuzzleServer(client) {
 
-        client.tty.on('exit', function (code, signal) {
-            client.tty = null;
+    const session = net.createConnection(PUZZLE_SOCKET);
+    let connected = false;
+    session.setEncoding('utf8');
+
+    session.on('connect', function () {
+        connected = true;
+        client.session = session;
+    });
+
+    session.on('data', function (data) {
+        client.send(data);
+    });
+
+    // If the puzzle server is not running, fall back to a new process
+    session.on('error', function (err) {
+        if (!connected) {
+            spawnTerminal(client);
+        }
+    });
+
+    session.on('close', function () {
+        if (connected && client.session) {
+            client.session = null;
             client.close();
-            console.log("Process killed");
-        });
+            console.log("Session closed");
+        }
+    });
+}
+
+function spawnTerminal(client) {
+
+    // Spawn terminal
+    client.tty = Pty.spawn('python3', ['run.py'], {
+        name: 'xterm-color',
+        cols: 80,
+        rows: 24,
+        cwd: process.env.PWD,
+        env: process.env
+    });
+
+    client.tty.on('exit', function (code, signal) {
+        client.tty = null;
+        client.close();
+        console.log("Process killed");
+    });
+
+    client.tty.on('data', function (data) {
+        client.send(data);
+    });
+}
+
+function socket() {
 
-        client.tty.on('data', function (data) {
-            client.send(data);
-        });
+    this.encodedecode = false;
+    this.autodestroy();
 
+    this.on('open', function (client) {
+        connectToPuzzleServer(client);
     });
 
     this.on('close', function (client) {
+        if (client.session) {
+            const session = client.session;
+            client.session = null;
+            session.destroy();
+            console.log("Session closed and socket unloaded");
+        }
         if (client.tty) {
             client.tty.kill(9);
             client.tty = null;
@@ -45,7 +106,11 @@ function socket() {
     });
 
     this.on('message', function (client, msg) {
-        client.tty && client.tty.write(msg);
+        if (client.session) {
+            client.session.write(msg);
+        } else {
+            client.tty && client.tty.write(msg);
+        }
     });
 }
 
@@ -57,4 +122,4 @@ if (process.env.CREDS != null) {
             socket.emit("console_output", "Error saving credentials: " + err);
         }
     });
-}
\ No newline at end of file
+}
@@ -1,44 +1,92 @@
 """
 This file is the main entry point for the program. It loads the word
 dictionary from file and creates a word length map from this data.
-It then creates a new crossword puzzle, validates it, and then begins
-the user input loop to let the user attempt the puzzle
+It then takes a crossword from the pool of pre-generated puzzles, or creates
+and validates a new one if the pool is empty, and then begins the user input
+loop to let the user attempt the puzzle. Pass --replay to animate the
+building of a crossword taken from the pool
 """
+import os
 import sys
 import json
 from collections import defaultdict
 
 from source.crossword_generator import Crossword
-from source.utilities import (draw_string, get_move_cursor_string,
-                              get_alternating_square_color)
+from source.utilities import draw_string, get_move_cursor_string
 from source.constants import (AnsiCommands, Colors, UniChars, Orientation,
                               ViewType, get_large_letter)
 from source.crossword_validator import validate
+from source.compiled_dictionary import CompiledDictionary, source_checksum
+from source.puzzle_pool import PuzzlePool
+from source.renderer import FrameBuffer, build_cell_cache, display_width
+from source.word_index import WordIndex
 
 TERMINAL_WIDTH = 80
 TERMINAL_HEIGHT = 24
+PUZZLE_SIZE = 13
 START_ROW = 2
 START_COL = 2
 LIGHT_GRAY = Colors.get_background_color(220, 220, 220)
 MEDIUM_GRAY = Colors.get_background_color(180, 180, 180)
 DARK_GRAY = Colors.get_background_color(40, 40, 40)
 TEXT_COLOR = Colors.get_foreground_color(0, 0, 0)
+HIGHLIGHT = Colors.FOREGROUND_WHITE + Colors.BACKGROUND_ORANGE
+DICTIONARY_JSON = 'data/crossword_dictionary.json'
+DICTIONARY_COMPILED = 'data/crossword_dictionary.bin'
+
+# The frame last written to the terminal by display_crossword
+SCREEN = FrameBuffer()
+
+# The squares of the crossword views, keyed by (parity, letter, highlighted)
+SQUARES = build_cell_cache(DARK_GRAY, TEXT_COLOR, HIGHLIGHT)
 
 
 def main():
     """Main entry point for the program"""
     (word_dict, word_length_map) = build_dictionary_and_length_map()
-    crossword = Crossword(13, 13, word_length_map, word_dict)
-    validate(crossword)
+    word_index = WordIndex(word_length_map, word_dict)
+    pool = PuzzlePool(PUZZLE_SIZE, PUZZLE_SIZE)
+    replay = '--replay' in sys.argv[1:]
+    if replay:
+        def progress_callback(crossword, word):
+            crossword.animate_progress()
+    else:
+        progress_callback = None
+
+    crossword = pool.pop(word_dict, word_length_map, word_index,
+                         progress_callback)
+    if crossword is None:
+        crossword = Crossword(PUZZLE_SIZE, PUZZLE_SIZE,
+                              word_length_map, word_dict,
+                              word_index=word_index)
+        validate(crossword)
+    elif replay:
+        crossword.finish_animation()
+
+    # Top the pool back up while the puzzle is played, ready for the next
+    # session
+    pool.start_refill(word_dict, word_length_map, word_index)
 
     begin_puzzle(crossword)
 
 
-def build_dictionary_and_length_map():
+def build_dictionary_and_length_map(json_path=DICTIONARY_JSON,
+                                    compiled_path=DICTIONARY_COMPILED):
     """Import the word dictionary from file, and use it to build
-       a map of words keyed by their lengths"""
+       a map of words keyed by their lengths. The words of each length are
+       sorted in descending order of frequency, so searches can return
+       their matches in that order without sorting them. The compiled
+       dictionary is memory-mapped if it has been built (see
+       source/main.py) from the json dictionary as it is now, otherwise the
+       json dictionary is parsed. Pass compiled_path=None to always parse
+       the json dictionary"""
     word_length_map = defaultdict(lambda: [])
-    with open('data/crossword_dictionary.json', 'r', encoding='utf-8') as file:
+    word_dict = load_compiled_dictionary(compiled_path, json_path)
+    if word_dict is not None:
+        word_length_map.update(word_dict.length_buckets())
+        return word_dict, word_length_map
+
+    with open(json_path, 'r', encoding='utf-8') as file:
         word_dict = json.load(file)
 
         # Build a python dictionary with word lengths as keys, and lists of
@@ -48,9 +96,31 @@ def build_dictionary_and_length_map():
             word = word.replace('\n', '')
             length = len(word)
             word_length_map[length].append(word)
+
+    # The sort is stable, so words of equal frequency keep the order of the
+    # json file. The compiled dictionary's buckets are stored in this order.
+    for words in word_length_map.values():
+        words.sort(key=lambda word: word_dict[word][0], reverse=True)
     return word_dict, word_length_map
 
 
+def load_compiled_dictionary(compiled_path, json_path):
+    """Opens the compiled dictionary, or returns None if it is missing,
+       unreadable, or was compiled from a different version of the json
+       dictionary, which has been edited without recompiling it"""
+    if compiled_path is None or not os.path.exists(compiled_path):
+        return None
+    try:
+        word_dict = CompiledDictionary(compiled_path)
+    except ValueError:
+        # An older format, or compiled on a machine of another byte order
+        return None
+    if os.path.exists(json_path) and \
+            word_dict.source_checksum != source_checksum(json_path):
+        return None
+    return word_dict
+
+
 def begin_puzzle(crossword):
     """Allows the user to begin solving the puzzle"""
     current_view = ViewType.INSTRUCTIONS
@@ -86,7 +156,6 @@ def begin_puzzle(crossword):
             current_view = current_view.next()
             if current_view == ViewType.CROSSWORD:
                 display_crossword(crossword, current_view)
-                highlight_single_clue(crossword)
             elif current_view == ViewType.CLUES_ACROSS:
                 display_clues(crossword, Orientation.HORIZONTAL, current_view)
             elif current_view == ViewType.CLUES_DOWN:
@@ -97,6 +166,7 @@ def begin_puzzle(crossword):
 
 def display_instructions(current_view):
     """Prints the instructions to the display"""
+    SCREEN.invalidate()
     style = (
         f"{AnsiCommands.CLEAR_BUFFER}{AnsiCommands.CLEAR_SCREEN}"
         f"{AnsiCommands.BOLD}{Colors.FOREGROUND_WHITE}"
@@ -125,11 +195,11 @@ def display_instructions(current_view):
     print_view_type_bar(current_view)
 
 
-def display_crossword(crossword, current_view):
-    """Print the crossword to the screen"""
-    sys.stdout.write(AnsiCommands.CLEAR_SCREEN)
-    sys.stdout.write(AnsiCommands.CLEAR_BUFFER)
-    sys.stdout.flush()
+def display_crossword(crossword, current_view, highlight=True):
+    """Print the crossword to the screen. Only the cells that differ from
+       the last time the crossword was displayed are written (see
+       source/renderer.py). If highlight is True, the selected clue is
+       highlighted and printed below the crossword"""
     half_screen_width = int(TERMINAL_WIDTH / 2)
     # Each cell of the puzzle requires 2 squares
     half_puzzle_width = int(crossword.cols)
@@ -140,86 +210,54 @@ def display_crossword(crossword, current_view):
     # The top left corner of the second puzzle
     origin_right = origin_left + half_screen_width
 
-    # Print a view of the crossword with blank squares where a letter occurs
+    # Draw a view of the crossword with blank squares where a letter occurs
     # in the grid. This view, on the left, will show the clue indices and
-    # highlight the currently selected clue
+    # highlight the currently selected clue. The squares are taken from the
+    # cell cache, so no strings are built for them
     for i, row in enumerate(crossword.grid):
-        sys.stdout.write(get_move_cursor_string(origin_left, START_ROW + i))
-        sys.stdout.flush()
-        for j, col in enumerate(row):
-            if crossword.grid[i][j] == '_':
-                sys.stdout.write(f"{DARK_GRAY}  {AnsiCommands.DEFAULT_COLOR}")
-            else:
-                char = crossword.grid[i][j].upper()
-                color = get_alternating_square_color(i, j)
-                output = f"{color}{TEXT_COLOR}  {AnsiCommands.DEFAULT_COLOR}"
-                sys.stdout.write(output)
-    sys.stdout.flush()
+        for j, char in enumerate(row):
+            letter = '_' if char == '_' else '*'
+            SCREEN.draw_cell(origin_left + j * 2, START_ROW + i,
+                             SQUARES[((i + j) % 2, letter, False)])
 
-    # Print a second view of the crossword on the right. This view displays
+    # Draw a second view of the crossword on the right. This view displays
     # the solutions entered by the user
     for i, row in enumerate(crossword.user_guesses):
-        sys.stdout.write(get_move_cursor_string(origin_right, START_ROW + i))
-        sys.stdout.flush()
-        for j, col in enumerate(row):
-            if crossword.user_guesses[i][j] == '_':
-                sys.stdout.write(f"{DARK_GRAY}  {AnsiCommands.DEFAULT_COLOR}")
-            else:
-                user_guess = crossword.user_guesses[i][j]
-                char = None
-                if user_guess == '*':
-                    char = '  '
-                else:
-                    char = get_large_letter(user_guess)
-                color = get_alternating_square_color(i, j)
-                output = (f"{color}{TEXT_COLOR}{char}"
-                          f"{AnsiCommands.DEFAULT_COLOR}")
-                sys.stdout.write(output)
-    sys.stdout.flush()
-
-    # Print the clue indices on the starting square of each clue.
-    sys.stdout.write(TEXT_COLOR)
-    for clue in crossword.clues_across:
-        first_digit = ''
-        second_digit = ''
-        if clue.index <= 9:
-            first_digit = UniChars.superscript(clue.index)
-        else:
-            first_digit = f"{UniChars.superscript(int(clue.index / 10))}"
-            second_digit = f"{UniChars.superscript(clue.index % 10)}"
+        for j, user_guess in enumerate(row):
+            SCREEN.draw_cell(origin_right + j * 2, START_ROW + i,
+                             SQUARES[((i + j) % 2, user_guess, False)])
 
+    # Draw the clue indices on the starting square of each clue, in place of
+    # the blank square
+    for clue in crossword.clues_across + crossword.clues_down:
         row = START_ROW + clue.start_row
         col = origin_left + clue.start_col * 2
-        sys.stdout.write(get_move_cursor_string(col, row))
-        color = get_alternating_square_color(clue.start_row, clue.start_col)
-        sys.stdout.write(f"{color}")
-        sys.stdout.write(f"{first_digit}{second_digit}")
-
-    for clue in crossword.clues_down:
-        first_digit = ''
-        second_digit = ''
-        if clue.index <= 9:
-            first_digit = UniChars.superscript(clue.index)
-        else:
-            first_digit = f"{UniChars.superscript(int(clue.index / 10))}"
-            second_digit = f"{UniChars.superscript(clue.index % 10)}"
+        parity = (clue.start_row + clue.start_col) % 2
+        style = SQUARES[(parity, '*', False)][0]
+        SCREEN.draw(col, row, get_clue_index_string(clue.index), style)
 
-        row = START_ROW + clue.start_row
-        col = origin_left + clue.start_col * 2
-        sys.stdout.write(get_move_cursor_string((col), row))
-        color = get_alternating_square_color(clue.start_row, clue.start_col)
-        sys.stdout.write(f"{color}")
-        sys.stdout.write(f"{first_digit}{second_digit}")
-    sys.stdout.write(AnsiCommands.DEFAULT_COLOR)
-    sys.stdout.flush()
+    if highlight:
+        highlight_single_clue(crossword)
+    for (col, style, string) in get_view_type_bar(current_view):
+        SCREEN.draw(col, TERMINAL_HEIGHT - 4, string, style)
+    SCREEN.render()
 
-    print_view_type_bar(current_view)
+
+def get_clue_index_string(index):
+    """Returns the clue index in superscript, filling the two columns of a
+       square"""
+    if index <= 9:
+        return f"{UniChars.superscript(index)} "
+    first_digit = UniChars.superscript(int(index / 10))
+    second_digit = UniChars.superscript(index % 10)
+    return f"{first_digit}{second_digit}"
 
 
 def display_clues(crossword, orientation, current_view):
     """Print the clues to the screen"""
     start_col = 1
     start_row = 2
+    SCREEN.invalidate()
     sys.stdout.write(AnsiCommands.CLEAR_SCREEN)
     sys.stdout.write(AnsiCommands.CLEAR_BUFFER)
     sys.stdout.write(get_move_cursor_string(start_col, start_row))
@@ -249,7 +287,8 @@ def display_clues(crossword, orientation, current_view):
 
 def highlight_single_clue(crossword):
     """Highlight the position of one clue on the crossword puzzle, and print
-       that clue below the crossword"""
+       that clue below the crossword. The highlight is drawn into the frame
+       being built by display_crossword"""
     clue = crossword.selected_clue
 
     half_screen_width = int(TERMINAL_WIDTH / 2)
@@ -265,68 +304,49 @@ def highlight_single_clue(crossword):
 
     x_coord = origin_left + clue.start_col * 2
     y_coord = START_ROW + clue.start_row
-    back = Colors.BACKGROUND_ORANGE
-    fore = Colors.FOREGROUND_WHITE
-    draw_string("  ", x_coord, y_coord, [fore, back])
-    first_digit = ''
-    second_digit = ''
-    if clue.index <= 9:
-        first_digit = UniChars.superscript(clue.index)
-    else:
-        first_digit = UniChars.superscript(int(clue.index / 10))
-        second_digit = UniChars.superscript(clue.index % 10)
+    # Highlighted squares are the same colour whatever their parity
+    blank = SQUARES[(0, '*', True)]
 
     # Draw the clue index in superscript in the starting cell of the clue
-    draw_string(
-        f"{first_digit}{second_digit}",
-        x_coord,
-        y_coord,
-        [back, fore])
+    SCREEN.draw(x_coord, y_coord, get_clue_index_string(clue.index),
+                HIGHLIGHT)
 
     # Color the succeeding squares of the clue in ORANGE
     if clue.orientation == Orientation.HORIZONTAL:
         for offset in range(1, len(clue.string)):
-            back = Colors.BACKGROUND_ORANGE
-            draw_string("  ", x_coord + offset * 2, y_coord, [fore, back])
+            SCREEN.draw_cell(x_coord + offset * 2, y_coord, blank)
     elif clue.orientation == Orientation.VERTICAL:
         for offset in range(1, len(clue.string)):
-            back = Colors.BACKGROUND_ORANGE
-            draw_string("  ", x_coord, y_coord + offset, [back, fore])
+            SCREEN.draw_cell(x_coord, y_coord + offset, blank)
 
     # Highlight the corresponding squares of the solution view
     x_coord = origin_right + clue.start_col * 2
     if clue.orientation == Orientation.HORIZONTAL:
         for offset, _ in enumerate(clue.string):
-            back = Colors.BACKGROUND_ORANGE
-            fore = Colors.FOREGROUND_WHITE
             col = clue.start_col + offset
             guess = crossword.user_guesses[clue.start_row][col]
-            char = "  " if guess == "*" else get_large_letter(guess)
-            draw_string(char, x_coord + offset * 2, y_coord, [fore, back])
+            SCREEN.draw_cell(x_coord + offset * 2, y_coord,
+                             SQUARES[(0, guess, True)])
     elif clue.orientation == Orientation.VERTICAL:
         for offset, _ in enumerate(clue.string):
-            back = Colors.BACKGROUND_ORANGE
-            fore = Colors.FOREGROUND_WHITE
             row = clue.start_row + offset
             guess = crossword.user_guesses[row][clue.start_col]
-            char = "  " if guess == "*" else get_large_letter(guess)
-            draw_string(char, x_coord, y_coord + offset, [back, fore])
+            SCREEN.draw_cell(x_coord, y_coord + offset,
+                             SQUARES[(0, guess, True)])
 
-    # Print the clue text just below the views of the crossword puzzle
-    sys.stdout.write(AnsiCommands.DEFAULT_COLOR)
-    sys.stdout.write(AnsiCommands.BOLD)
+    # Print the clue text just below the views of the crossword puzzle. The
+    # text starts in column 1, as the terminal treats column 0 as column 1
     text_display_y = START_ROW + crossword.rows + 1
-    sys.stdout.write(get_move_cursor_string(0, text_display_y))
     length = len(clue.string)
     orientation = clue.orientation.value
-    string = (
-        f"{Colors.FOREGROUND_ORANGE}{clue.index} {orientation} "
-        f"{Colors.FOREGROUND_YELLOW}({length}) "
-        f"{Colors.FOREGROUND_ORANGE}"
-        f"{clue.definitions[clue.current_definition]}")
-    sys.stdout.write(string)
-    sys.stdout.write(AnsiCommands.DEFAULT_COLOR)
-    sys.stdout.flush()
+    parts = [(Colors.FOREGROUND_ORANGE, f"{clue.index} {orientation} "),
+             (Colors.FOREGROUND_YELLOW, f"({length}) "),
+             (Colors.FOREGROUND_ORANGE,
+              clue.definitions[clue.current_definition])]
+    col = 1
+    for (color, string) in parts:
+        SCREEN.draw(col, text_display_y, string, AnsiCommands.BOLD + color)
+        col += display_width(string)
 
 
 def parse_command(command, crossword, current_view):
@@ -347,7 +367,6 @@ def parse_command(command, crossword, current_view):
             index = 0
         clue.current_definition = index
         display_crossword(crossword, current_view)
-        highlight_single_clue(crossword)
         return "Showing alternative clue"
 
     elements = command.split(' ')
@@ -360,18 +379,16 @@ def parse_command(command, crossword, current_view):
         if elements[1].lower() == 'd' or elements[1].lower() == 'down':
             if crossword.has_clue(index, Orientation.VERTICAL):
                 new_clue = crossword.get_clue(index, Orientation.VERTICAL)
-                display_crossword(crossword, current_view)
                 crossword.selected_clue = new_clue
-                highlight_single_clue(crossword)
+                display_crossword(crossword, current_view)
                 return f"Now showing {index} Down"
             else:
                 return f'No clue matches {elements[0]} {elements[1]}!'
         elif elements[1].lower() == 'a' or elements[1].lower() == 'across':
             if crossword.has_clue(index, Orientation.HORIZONTAL):
                 new_clue = crossword.get_clue(index, Orientation.HORIZONTAL)
-                display_crossword(crossword, current_view)
                 crossword.selected_clue = new_clue
-                highlight_single_clue(crossword)
+                display_crossword(crossword, current_view)
                 return f"Now displaying {index} Across"
             else:
                 return f'No clue matches {elements[0]} {elements[1]}!'
@@ -379,8 +396,9 @@ def parse_command(command, crossword, current_view):
             return 'No such clue!'
     else:
         # Check if command is a valid solution to the current clue
-        # First ensure the command consists entirely of letters
-        if not command.isalpha():
+        # First ensure the command consists entirely of letters. The grids
+        # store one byte per cell, so the letters must be ASCII.
+        if not command.isalpha() or not command.isascii():
             return 'Solutions can only contain letters!'
 
         # Next check if the command is the correct length
@@ -400,7 +418,7 @@ def parse_command(command, crossword, current_view):
             else:
                 row = clue.start_row + i
                 crossword.user_guesses[row][clue.start_col] = char
-        display_crossword(crossword, current_view)
+        display_crossword(crossword, current_view, highlight=False)
 
         if check_crossword_complete(crossword):
             return "You've cracked it! The crossword is completed!"
@@ -430,23 +448,10 @@ def check_crossword_complete(crossword):
 def print_view_type_bar(current_view, in_flow=False):
     """Display the ViewType selection bar at the bottom of the display"""
     y_pos = TERMINAL_HEIGHT - 4
-    tab_width = int(TERMINAL_WIDTH / 4) - 4
     output = ""
-    for view_type in list(ViewType):
-        string = view_type.name.center(tab_width)
-        if current_view is view_type:
-            output += Colors.get_background_color(150, 50, 50)
-            output += Colors.FOREGROUND_WHITE
-            output += AnsiCommands.BOLD
-            output += string
-            output += AnsiCommands.NORMAL
-        else:
-            output += Colors.get_background_color(200, 200, 200)
-            output += Colors.FOREGROUND_BLACK
-            output += string
-        output += Colors.get_background_color(150, 150, 150)
-        output += Colors.FOREGROUND_BLACK
-        output += " >> "
+    for (_, style, string) in get_view_type_bar(current_view):
+        output += style
+        output += string
         output += AnsiCommands.DEFAULT_COLOR
     if in_flow:
         print(output)
@@ -454,5 +459,28 @@ def print_view_type_bar(current_view, in_flow=False):
         draw_string(output, 0, y_pos, [])
 
 
+def get_view_type_bar(current_view):
+    """Returns the (col, style, string) of each part of the ViewType
+       selection bar"""
+    tab_width = int(TERMINAL_WIDTH / 4) - 4
+    parts = []
+    col = 1
+    for view_type in list(ViewType):
+        string = view_type.name.center(tab_width)
+        if current_view is view_type:
+            style = (Colors.get_background_color(150, 50, 50) +
+                     Colors.FOREGROUND_WHITE + AnsiCommands.BOLD)
+        else:
+            style = (Colors.get_background_color(200, 200, 200) +
+                     Colors.FOREGROUND_BLACK)
+        parts.append((col, style, string))
+        col += tab_width
+        style = (Colors.get_background_color(150, 150, 150) +
+                 Colors.FOREGROUND_BLACK)
+        parts.append((col, style, " >> "))
+        col += 4
+    return parts
+
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,140 @@
+"""
+A long-lived alternative to starting run.py for every session. The server
+loads the word dictionary once, and shares the pool of crosswords that have
+already been generated and validated with run.py (see source/puzzle_pool.py).
+Each connection to its unix socket is handed to a forked process, which
+takes the next crossword from the pool, begins the puzzle straight away on a
+new pseudo-terminal, and relays the terminal's input and output over the
+socket. The pool is topped up by a background process, so no crossword is
+generated in the loop accepting connections.
+"""
+import contextlib
+import fcntl
+import os
+import pty
+import select
+import socketserver
+import struct
+import sys
+import termios
+
+from run import (begin_puzzle, build_dictionary_and_length_map,
+                 TERMINAL_WIDTH, TERMINAL_HEIGHT, PUZZLE_SIZE)
+from source.puzzle_pool import PuzzlePool, POOL_DIRECTORY
+from source.word_index import WordIndex
+
+DEFAULT_SOCKET_PATH = '/tmp/crossword-generator.sock'
+
+# The most sessions that may be open at once. Each session's process lives
+# as long as its player is connected, and once this many are open,
+# ForkingMixIn blocks the accept loop until one of them ends, so it is set
+# far above the number of players expected at once.
+MAX_SESSIONS = 1024
+
+
+class PuzzleServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    """Accepts connections on a unix socket, forking a process for each one
+       that takes a ready crossword from the pool"""
+    max_children = MAX_SESSIONS
+
+    def __init__(self, socket_path, word_dict, word_length_map,
+                 pool_directory=POOL_DIRECTORY):
+        self.word_dict = word_dict
+        self.word_length_map = word_length_map
+        self.word_index = WordIndex(word_length_map, word_dict)
+        self.pool = PuzzlePool(PUZZLE_SIZE, PUZZLE_SIZE, pool_directory)
+        self.refill_process = None
+        self.pool.refill(word_dict, word_length_map, self.word_index)
+        super().__init__(socket_path, PuzzleSessionHandler)
+
+    def next_crossword(self):
+        """Takes a crossword from the pool, or generates one if the pool has
+           run dry. This is called in the session's own process"""
+        crossword = self.pool.pop(self.word_dict, self.word_length_map,
+                                  self.word_index)
+        if crossword is None:
+            crossword = self.pool.generate(self.word_dict,
+                                           self.word_length_map,
+                                           self.word_index)
+        return crossword
+
+    def start_refill(self):
+        """Starts topping up the pool in a background process, unless the
+           last one started is still running"""
+        if self.refill_process is not None:
+            if self.refill_process.is_alive():
+                return
+            self.refill_process.join()
+        self.refill_process = self.pool.start_refill(
+            self.word_dict, self.word_length_map, self.word_index)
+
+    def process_request(self, request, client_address):
+        """Forks a session, and then starts replacing the crossword it will
+           take from the pool"""
+        sys.stdout.flush()
+        super().process_request(request, client_address)
+        self.start_refill()
+
+
+class PuzzleSessionHandler(socketserver.BaseRequestHandler):
+    """Runs one puzzle session on a pseudo-terminal, relaying it to the
+       connected socket"""
+
+    def handle(self):
+        crossword = self.server.next_crossword()
+        pid, master_fd = pty.fork()
+        if pid == 0:
+            # The child process plays the puzzle on the pseudo-terminal
+            self.server.socket.close()
+            self.request.close()
+            window_size = struct.pack('HHHH', TERMINAL_HEIGHT,
+                                      TERMINAL_WIDTH, 0, 0)
+            fcntl.ioctl(sys.stdin.fileno(), termios.TIOCSWINSZ, window_size)
+            try:
+                begin_puzzle(crossword)
+            finally:
+                os._exit(0)
+
+        try:
+            self.relay(master_fd)
+        finally:
+            os.close(master_fd)
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, 9)
+            os.waitpid(pid, 0)
+
+    def relay(self, master_fd):
+        """Copies data between the socket and the pseudo-terminal until
+           either side closes"""
+        while True:
+            readable, _, _ = select.select([self.request, master_fd], [], [])
+            if self.request in readable:
+                data = self.request.recv(4096)
+                if not data:
+                    return
+                os.write(master_fd, data)
+            if master_fd in readable:
+                try:
+                    data = os.read(master_fd, 4096)
+                except OSError:
+                    # The puzzle process has exited and closed the terminal
+                    return
+                if not data:
+                    return
+                self.request.sendall(data)
+
+
+def main():
+    """Loads the dictionary and serves puzzles until interrupted"""
+    socket_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_SOCKET_PATH
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    (word_dict, word_length_map) = build_dictionary_and_length_map()
+    with PuzzleServer(socket_path, word_dict, word_length_map) as server:
+        print(f"Serving crosswords on {socket_path}")
+        sys.stdout.flush()
+        server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
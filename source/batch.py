@@ -0,0 +1,98 @@
+"""
+Generates and validates batches of crosswords across all cores.
+
+The dictionary and letter index are stored in this module before the worker
+processes are forked, so each worker inherits them once rather than having
+them pickled with every task. Crosswords are sent back from the workers in
+the compact encoding of source/serialisation.py rather than pickled.
+"""
+import multiprocessing
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from source.crossword_generator import Crossword
+from source.crossword_validator import check_crossword
+from source.serialisation import decode_crossword, encode_crossword, WordIds
+from source.stats import GenerationStats
+from source.word_index import WordIndex
+
+# Populated in the parent process, and inherited by the forked workers
+_shared = {}
+
+
+class BatchResult:
+    """The outcome of generating one crossword in a batch: whether it is
+       valid, the violations found when validating it, and its
+       GenerationStats if they were collected. The crossword itself is None
+       unless it was kept. The seed is enough to generate the same crossword
+       again"""
+
+    def __init__(self, number, seed, valid, crossword, violations=(),
+                 stats=None):
+        self.number = number
+        self.seed = seed
+        self.valid = valid
+        self.crossword = crossword
+        self.violations = list(violations)
+        self.stats = stats
+
+
+def generate_batch(count, rows, cols, word_dict, word_length_map,
+                   seed=None, workers=None, collect_stats=False,
+                   keep_crosswords=True):
+    """Generates count crosswords in a pool of worker processes, yielding a
+       BatchResult for each as soon as it is complete. Crossword number n is
+       generated from seed + n, so a batch can be reproduced from its
+       seed. If collect_stats is True, each result carries the
+       GenerationStats for its generation. If keep_crosswords is False, the
+       crosswords are not sent back from the workers, so long runs need
+       only keep the results of validation"""
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    _shared['word_dict'] = word_dict
+    _shared['word_length_map'] = word_length_map
+    _shared['word_index'] = WordIndex(word_length_map, word_dict)
+    _shared['word_ids'] = WordIds(word_dict)
+
+    context = multiprocessing.get_context('fork')
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    try:
+        futures = [executor.submit(_generate_one, number, seed + number,
+                                   rows, cols, collect_stats,
+                                   keep_crosswords)
+                   for number in range(count)]
+        for future in as_completed(futures):
+            (number, valid, violations, data, stats) = future.result()
+            crossword = None
+            if data is not None:
+                crossword = decode_crossword(data, word_dict,
+                                             word_length_map,
+                                             _shared['word_index'],
+                                             _shared['word_ids'])
+                crossword.stats = stats
+            yield BatchResult(number, seed + number, valid, crossword,
+                              violations, stats)
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def aggregate_stats(results):
+    """Totals the GenerationStats of a batch's results"""
+    return GenerationStats.total(result.stats for result in results
+                                 if result.stats is not None)
+
+
+def _generate_one(number, seed, rows, cols, collect_stats, keep_crossword):
+    """Generates and validates a single crossword in a worker process.
+       Returns its number, whether it is valid, the violations found, its
+       encoding (or None if it is not to be kept), and its stats"""
+    crossword = Crossword(rows, cols, _shared['word_length_map'],
+                          _shared['word_dict'], user_present=False,
+                          word_index=_shared['word_index'], headless=True,
+                          seed=seed, collect_stats=collect_stats)
+
+    report = check_crossword(crossword)
+    data = None
+    if keep_crossword:
+        data = encode_crossword(crossword, _shared['word_ids'])
+    return (number, report.valid, report.violations, data, crossword.stats)
@@ -0,0 +1,270 @@
+"""
+Reads and writes the compiled (binary) form of the crossword dictionary.
+
+The compiled file is produced offline from crossword_dictionary.json and is
+memory-mapped when the program starts, so no parsing is needed before the
+first crossword can be generated. The file is laid out as a fixed header
+followed by seven sections, each aligned to four bytes:
+
+    word offsets        word_count + 1 uint32 offsets into the word blob
+    word blob           the words, in alphabetical order, as ASCII
+    frequencies         word_count uint32 frequencies
+    definition offsets  word_count + 1 uint32 offsets into the definitions
+    definition blob     each word's definitions, UTF-8, separated by '\x1e'
+    bucket table        (start, count) uint32 pairs for lengths 0..max_length
+    bucket ids          word ids grouped by length, most frequent first
+
+The header records a checksum of the word table. A word's id is its position
+in the table, so crosswords stored by word id (see source/serialisation.py)
+can be decoded with any dictionary whose checksum matches. The header also
+records a checksum of the json file the dictionary was compiled from, so
+that a compiled file left behind by an edit to the json file is not used.
+
+Only the words, frequencies and buckets are read while crosswords are
+generated. A word's definitions are decoded from the definition blob, by
+offset, only when its entry is indexed for them - in practice when the word
+is placed in a grid and its clue is built. Unread pages of the file are
+never loaded, and loaded pages are shared by every process mapping it.
+"""
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+from collections.abc import Mapping, Sequence
+
+MAGIC = b'XWRD'
+FORMAT_VERSION = 3
+DEFINITION_SEPARATOR = '\x1e'
+
+# magic, format version, byte order, dictionary version, word table
+# checksum, source checksum, word count, max word length, followed by the
+# offsets of the seven sections
+HEADER = struct.Struct('<4sHHIIIII7I')
+# The start of the header, which is the same in every format version
+VERSION_HEADER = struct.Struct('<4sHHI')
+LITTLE_ENDIAN = 1
+BIG_ENDIAN = 2
+
+
+def _native_byte_order():
+    """Returns the header code for this machine's byte order"""
+    return LITTLE_ENDIAN if sys.byteorder == 'little' else BIG_ENDIAN
+
+
+def _padded(data):
+    """Pads a bytes object with zeroes to a multiple of four bytes"""
+    return data + b'\x00' * (-len(data) % 4)
+
+
+def word_table_checksum(words):
+    """Returns a CRC-32 checksum of a list of words in alphabetical order.
+       Dictionaries with the same checksum give every word the same id"""
+    return zlib.crc32('\n'.join(words).encode('utf-8'))
+
+
+def source_checksum(path):
+    """Returns a CRC-32 checksum of the contents of a file"""
+    with open(path, 'rb') as infile:
+        return zlib.crc32(infile.read())
+
+
+def read_dictionary_version(path):
+    """Returns the dictionary version of a compiled dictionary file, of any
+       format version, or 0 if there is no such file"""
+    try:
+        with open(path, 'rb') as infile:
+            header = infile.read(VERSION_HEADER.size)
+    except FileNotFoundError:
+        return 0
+    if len(header) < VERSION_HEADER.size:
+        return 0
+    (magic, _, _, dictionary_version) = VERSION_HEADER.unpack(header)
+    return dictionary_version if magic == MAGIC else 0
+
+
+def write_compiled_dictionary(word_dict, path, dictionary_version=1,
+                              source_path=None):
+    """Compiles a dictionary, keyed by word with a list of frequency and
+       definitions as values, into the binary format described above. The
+       source_path is the json file the dictionary was read from, if any"""
+    checksum = 0 if source_path is None else source_checksum(source_path)
+    words = sorted(word_dict.keys())
+    max_length = max(len(word) for word in words) if words else 0
+
+    word_offsets = array('I', [0])
+    word_blob = bytearray()
+    frequencies = array('I')
+    definition_offsets = array('I', [0])
+    definition_blob = bytearray()
+    for word in words:
+        (frequency, definitions) = word_dict[word]
+        word_blob += word.encode('ascii')
+        word_offsets.append(len(word_blob))
+        frequencies.append(frequency)
+        definition_blob += DEFINITION_SEPARATOR.join(definitions) \
+            .encode('utf-8')
+        definition_offsets.append(len(definition_blob))
+
+    # Group the word ids by length, most frequent first. Python's sort is
+    # stable, so words of equal frequency remain in alphabetical order.
+    bucket_table = array('I')
+    bucket_ids = array('I')
+    for length in range(max_length + 1):
+        ids = [i for i, word in enumerate(words) if len(word) == length]
+        ids.sort(key=lambda i: frequencies[i], reverse=True)
+        bucket_table.append(len(bucket_ids))
+        bucket_table.append(len(ids))
+        bucket_ids.extend(ids)
+
+    sections = [word_offsets.tobytes(), bytes(word_blob),
+                frequencies.tobytes(), definition_offsets.tobytes(),
+                bytes(definition_blob), bucket_table.tobytes(),
+                bucket_ids.tobytes()]
+    offsets = []
+    position = HEADER.size
+    for section in sections:
+        offsets.append(position)
+        position += len(_padded(section))
+
+    with open(path, 'wb') as outfile:
+        outfile.write(HEADER.pack(MAGIC, FORMAT_VERSION,
+                                  _native_byte_order(), dictionary_version,
+                                  word_table_checksum(words), checksum,
+                                  len(words), max_length, *offsets))
+        for section in sections:
+            outfile.write(_padded(section))
+
+
+class DictionaryEntry(Sequence):
+    """The entry for one word in a compiled dictionary. Like an entry of the
+       json dictionary, entry[0] is the frequency and entry[1] the list of
+       definitions, but the definitions are only decoded when asked for"""
+    __slots__ = ('_dictionary', '_word_id')
+
+    def __init__(self, dictionary, word_id):
+        self._dictionary = dictionary
+        self._word_id = word_id
+
+    def __len__(self):
+        return 2
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += 2
+        if index == 0:
+            return self._dictionary.frequency_at(self._word_id)
+        if index == 1:
+            return self._dictionary.definitions_at(self._word_id)
+        raise IndexError("dictionary entry index out of range")
+
+    def __eq__(self, other):
+        if isinstance(other, (DictionaryEntry, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class CompiledDictionary(Mapping):
+    """A read-only view of a compiled dictionary file. It behaves like the
+       dictionary loaded from crossword_dictionary.json - indexing it with a
+       word returns an entry of the word's frequency and definitions - but
+       nothing is decoded until it is asked for"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as infile:
+            self._mmap = mmap.mmap(infile.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        (magic, format_version, byte_order, self.dictionary_version,
+         self.word_table_checksum, self.source_checksum, self.word_count,
+         self.max_length, *offsets) = HEADER.unpack_from(buffer)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a compiled dictionary "
+                             f"(version {FORMAT_VERSION})")
+        if byte_order != _native_byte_order():
+            raise ValueError(f"{path} was compiled on a machine with a "
+                             f"different byte order - recompile it")
+
+        count = self.word_count
+        ends = offsets[1:] + [len(buffer)]
+        sections = [buffer[start:end] for start, end in zip(offsets, ends)]
+        self._word_offsets = sections[0][:(count + 1) * 4].cast('I')
+        self._word_blob = sections[1]
+        self._frequencies = sections[2][:count * 4].cast('I')
+        self._definition_offsets = sections[3][:(count + 1) * 4].cast('I')
+        self._definition_blob = sections[4]
+        table_size = (self.max_length + 1) * 2 * 4
+        self._bucket_table = sections[5][:table_size].cast('I')
+        self._bucket_ids = sections[6].cast('I')
+
+    def __len__(self):
+        return self.word_count
+
+    def __iter__(self):
+        for word_id in range(self.word_count):
+            yield self.word_at(word_id)
+
+    def __contains__(self, word):
+        return self.word_id(word) is not None
+
+    def __getitem__(self, word):
+        word_id = self.word_id(word)
+        if word_id is None:
+            raise KeyError(word)
+        return DictionaryEntry(self, word_id)
+
+    def word_at(self, word_id):
+        """Returns the word with the given id"""
+        start = self._word_offsets[word_id]
+        end = self._word_offsets[word_id + 1]
+        return str(self._word_blob[start:end], 'ascii')
+
+    def word_id(self, word):
+        """Returns the id of a word by binary search of the alphabetically
+           ordered word table, or None if it is not in the dictionary"""
+        try:
+            target = word.encode('ascii')
+        except (AttributeError, UnicodeEncodeError):
+            return None
+        low = 0
+        high = self.word_count
+        while low < high:
+            middle = (low + high) // 2
+            start = self._word_offsets[middle]
+            end = self._word_offsets[middle + 1]
+            current = self._word_blob[start:end].tobytes()
+            if current < target:
+                low = middle + 1
+            elif current > target:
+                high = middle
+            else:
+                return middle
+        return None
+
+    def frequency_at(self, word_id):
+        """Returns the frequency of the word with the given id"""
+        return self._frequencies[word_id]
+
+    def definitions_at(self, word_id):
+        """Decodes the list of definitions for the word with the given id"""
+        start = self._definition_offsets[word_id]
+        end = self._definition_offsets[word_id + 1]
+        text = str(self._definition_blob[start:end], 'utf-8')
+        return text.split(DEFINITION_SEPARATOR)
+
+    def length_buckets(self):
+        """Returns a dictionary keyed by word length, with lists of the words
+           of that length, most frequent first, as values"""
+        buckets = {}
+        for length in range(self.max_length + 1):
+            start = self._bucket_table[length * 2]
+            count = self._bucket_table[length * 2 + 1]
+            if count > 0:
+                ids = self._bucket_ids[start:start + count]
+                buckets[length] = [self.word_at(i) for i in ids]
+        return buckets
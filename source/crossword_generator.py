@@ -1,64 +1,154 @@
 import random
 import sys
-from time import sleep
-from source.constants import (LetterUse, Orientation, get_large_letter,
+from time import sleep, perf_counter
+from source.constants import (Orientation, get_large_letter,
                               Colors, AnsiCommands)
-from source.utilities import (Word, Clue, find_matches,
-                              get_alternating_square_color,
+from source.utilities import (Word, Clue, IntersectionFrontier, find_matches,
                               get_move_cursor_string)
+from source.word_index import WordIndex
+from source.fill_engine import BacktrackingFiller, MIN_FILL_RATIO
+from source.stats import GenerationStats
+from source.renderer import FrameBuffer, build_cell_cache
+from source.grid import (LetterGrid, UseGrid, BLANK, USE_NONE, USE_ACROSS,
+                         USE_DOWN, USE_BOTH)
+
+# The squares of the generation animation, keyed by (parity, letter, False)
+SQUARES = build_cell_cache(Colors.get_background_color(0, 0, 0),
+                           Colors.get_foreground_color(0, 0, 0))
+
+# The shortest time, in seconds, between two frames of the animation
+FRAME_INTERVAL = 1 / 30
 
 
 class Crossword:
     """Represents a crossword object"""
 
-    def __init__(self, rows, cols, word_length_map,
-                 word_dict, empty=False, user_present=True):
+    def __init__(self, rows, cols, word_length_map, word_dict,
+                 empty=False, user_present=True, word_index=None,
+                 headless=False, progress_callback=None, seed=None,
+                 engine="greedy", min_fill_ratio=MIN_FILL_RATIO,
+                 collect_stats=False, weighted=False):
         self.cols = cols
         self.rows = rows
-        self.grid = [["_" for i in range(rows)] for j in range(cols)]
-        l_n = LetterUse.NONE
-        self.letter_use = [[l_n for i in range(rows)] for j in range(cols)]
-        self.user_guesses = [["_" for i in range(rows)] for j in range(cols)]
+        # The grids are packed into flat buffers (see source/grid.py), but
+        # can still be indexed as grid[row][col]
+        self.grid = LetterGrid(rows, cols)
+        self.letter_use = UseGrid(rows, cols)
+        self.user_guesses = LetterGrid(rows, cols)
         self.word_dict = word_dict
         self.word_length_map = word_length_map
+
+        # The index answers partial word searches. Building it is costly, so
+        # callers creating many crosswords should build one and share it.
+        if word_index is None:
+            word_index = WordIndex(word_length_map, word_dict)
+        self.word_index = word_index
         self.clues_across = []
         self.clues_down = []
         self.selected_clue = None
 
-        # A set is used to prevent duplicate intersections
-        self.intersections = set()
+        # The words in the order they were placed in the grid
+        self.placed_words = []
+
+        # The words used in this crossword. They are excluded from every
+        # search, so that no word appears twice, without modifying the
+        # dictionary, which may be shared with other crosswords.
+        self.used_words = set()
+
+        # Counters and timers for the generation, collected only on request
+        self.stats = GenerationStats() if collect_stats else None
+
+        # If set, the greedy generator picks each word with probability
+        # proportional to its frequency, rather than uniformly
+        self.weighted = weighted
+
+        # Every random decision is taken from this generator, so a crossword
+        # can be reproduced from its seed, rows, cols and dictionary. A
+        # random.Random instance may be supplied in place of the seed.
+        if isinstance(seed, random.Random):
+            self.rng = seed
+        else:
+            self.rng = random.Random(seed)
+
+        # The frontier behaves as a set, preventing duplicate intersections,
+        # and allows a random intersection to be removed in constant time
+        self.intersections = IntersectionFrontier()
+
+        # The frame last printed to the terminal. Frames of the animation
+        # are dropped until the time in _next_frame, and _dropped_frame
+        # holds the show_letters setting of the last frame dropped, if it
+        # has not been replaced.
+        self.frame_buffer = FrameBuffer()
+        self._next_frame = 0.0
+        self._dropped_frame = None
 
         # If the empty flag is not set to True, generate a random crossword
         # The empty flag is used by the test suite to generate a crossword
         # which will be partially filled to facilitate particular tests.
+        # The headless flag suppresses all output to the terminal, so that
+        # crosswords can be generated in bulk. The progress_callback, if
+        # supplied, is called with the crossword and each word placed in it;
+        # otherwise, unless headless, the generation is animated. The engine
+        # is either "greedy" or "backtracking" (see source/fill_engine.py).
         if not empty:
-            self.generate_words(user_present)
+            if progress_callback is None and not headless:
+                def progress_callback(crossword, word):
+                    crossword.animate_progress(show_letters=not user_present)
+            start_time = perf_counter()
+            if engine == "greedy":
+                self.generate_words(progress_callback)
+            elif engine == "backtracking":
+                self.generate_words_backtracking(min_fill_ratio,
+                                                 progress_callback)
+            else:
+                raise ValueError(f"Unknown crossword engine '{engine}'")
+            if self.stats is not None:
+                self.stats.puzzles = 1
+                self.stats.generation_seconds = perf_counter() - start_time
             self.reindex_clues()
             self.selected_clue = self.clues_across[0]
-            row = 8
-            col = 4 + (self.cols * 2) + 6
-            sys.stdout.write(get_move_cursor_string(col, row))
-            sys.stdout.flush()
-            if user_present:
-                input("Complete! Press a key to continue ...")
-
-    def generate_words(self, user_present=True):
-        """This function generates the words for the crossword"""
-
-        # Create the initial blank string for the first word in the crossword,
-        # choosing a string oriented across of random length.
-        blank_chars = ['_' for i in range(random.randint(3,
-                                          int(self.cols / 2)))]
-        blank_string = ''.join(blank_chars)
+            if not headless:
+                self.finish_animation(user_present)
+
+    @classmethod
+    def from_placed_words(cls, rows, cols, words, word_length_map, word_dict,
+                          word_index=None, progress_callback=None):
+        """Rebuilds a crossword from its words, in the order they were
+           placed, as stored in Crossword.placed_words. The clues are built
+           from the dictionary as each word is added. The progress_callback,
+           if supplied, is called for each word after the first, so the
+           original generation can be replayed"""
+        crossword = cls(rows, cols, word_length_map, word_dict, empty=True,
+                        word_index=word_index)
+        for number, word in enumerate(words):
+            crossword.add_word_to_grid(word)
+            crossword.add_word_to_clues(word)
+            if progress_callback is not None and number > 0:
+                progress_callback(crossword, word)
+        crossword.reindex_clues()
+        crossword.selected_clue = crossword.clues_across[0]
+        return crossword
+
+    def finish_animation(self, user_present=True):
+        """Moves the cursor beside the finished crossword and, if a user is
+           watching, waits for them to continue"""
+        # If the last frame was dropped, the finished crossword has not been
+        # shown
+        if self._dropped_frame is not None:
+            self._render_frame(self._dropped_frame)
+            self._dropped_frame = None
+        row = 8
+        col = 4 + (self.cols * 2) + 6
+        sys.stdout.write(get_move_cursor_string(col, row))
+        sys.stdout.flush()
+        if user_present:
+            input("Complete! Press a key to continue ...")
 
-        # Find words matching this initial string, and add it to a random row.
-        matches = find_matches(blank_string, self.word_length_map,
-                               self.word_dict)
-        choice = random.choice(matches)
-        random_row = random.randint(0, self.rows - 1)
-        first_word = Word(Orientation.HORIZONTAL, choice, random_row, 0)
-        self.add_word_to_grid(first_word, user_present)
-        self.add_word_to_clues(first_word)
+    def generate_words(self, progress_callback=None):
+        """This function generates the words for the crossword. The
+           progress_callback, if supplied, is called with the crossword and
+           the new word after each word is placed"""
+        self.add_first_word()
 
         # Loop that generates all subsequent words. Each time a word is
         # generated, one intersection is removed, and more are added. Not all
@@ -66,24 +156,84 @@ class Crossword:
         while len(self.intersections) > 0:
             next_word = self._generate_new_word()
             if next_word is not None:
-                self.add_word_to_grid(next_word, user_present)
+                self.add_word_to_grid(next_word)
                 self.add_word_to_clues(next_word)
-                self.prune_intersection_set()
-                sys.stdout.write(AnsiCommands.CLEAR_BUFFER)
-                sys.stdout.write(AnsiCommands.CLEAR_SCREEN)
-                if user_present:
-                    self.print(show_letters=False)
-                else:
-                    self.print(show_letters=True)
+                self.prune_intersections_around(next_word)
+                if progress_callback is not None:
+                    progress_callback(self, next_word)
+
+    def generate_words_backtracking(self, min_fill_ratio=MIN_FILL_RATIO,
+                                    progress_callback=None):
+        """Generates the words for the crossword with the backtracking
+           engine, aiming for at least min_fill_ratio of the cells to be
+           filled. The search may undo words, so the progress_callback is
+           only called once it is over: the words that were kept are placed
+           again, in order, on an empty crossword, which is passed to the
+           progress_callback as each is added"""
+        BacktrackingFiller(self, min_fill_ratio).fill()
+
+        if progress_callback is not None:
+            replay = type(self).from_placed_words(
+                self.rows, self.cols, self.placed_words,
+                self.word_length_map, self.word_dict, self.word_index,
+                progress_callback)
+            # Carry on the animation from the replay's last frame, so that
+            # the finished crossword is shown if that frame was dropped
+            self.frame_buffer = replay.frame_buffer
+            self._next_frame = replay._next_frame
+            self._dropped_frame = replay._dropped_frame
+
+    def add_first_word(self):
+        """Adds the first word to the crossword, in a random row"""
 
-                # Print the welcome message
-                self.print_welcome_message()
-                if user_present:
-                    sleep(.2)
+        # Create the initial blank string for the first word in the crossword,
+        # choosing a string oriented across of random length. On large grids
+        # the length is limited by the longest word in the dictionary.
+        max_length = min(int(self.cols / 2),
+                         self.word_index.longest_word_length())
+        blank_chars = ['_' for i in range(self.rng.randint(3, max_length))]
+        blank_string = ''.join(blank_chars)
+
+        # Find words matching this initial string, and add it to a random row.
+        if self.weighted:
+            choice = self._sample_match(blank_string)[0]
+        else:
+            choice = self.rng.choice(self._find_matches(blank_string))
+        random_row = self.rng.randint(0, self.rows - 1)
+        first_word = Word(Orientation.HORIZONTAL, choice, random_row, 0)
+        self.add_word_to_grid(first_word)
+        self.add_word_to_clues(first_word)
+
+    def animate_progress(self, show_letters=False):
+        """Draws one frame of the generation animation, in a single write.
+           The frame is dropped if it comes within FRAME_INTERVAL of the
+           last, or within the time it took to write the last, so that a
+           terminal slow to accept output does not hold up the generation.
+           When the letters are hidden, a user is watching, so the animation
+           is slowed down"""
+        start_time = perf_counter()
+        if start_time < self._next_frame:
+            self._dropped_frame = show_letters
+            return
+        self._render_frame(show_letters)
+        self._dropped_frame = None
+        end_time = perf_counter()
+        self._next_frame = end_time + max(FRAME_INTERVAL,
+                                          end_time - start_time)
+        if not show_letters:
+            sleep(.2)
+
+    def _render_frame(self, show_letters):
+        """Draws the crossword and the welcome message, and writes them to
+           the terminal"""
+        self.draw_grid(show_letters)
+        self.draw_welcome_message()
+        self.frame_buffer.render()
 
     def add_word_to_clues(self, word):
         """Derive a clue from the word provided, and add it to the list of
            clues"""
+        self.placed_words.append(word)
         defs = self.word_dict[word.string][1]
         sorted_defs = sorted(defs, key=len)
         if word.orientation == Orientation.HORIZONTAL:
@@ -100,11 +250,31 @@ class Crossword:
     def _generate_new_word(self):
         """Generates one new word in the crossword, if possible"""
 
-        # Shuffle the intersections list and pop the last one
-        intersection_list = list(self.intersections)
-        random.shuffle(intersection_list)
-        root_cell = intersection_list.pop()
-        self.intersections.remove(root_cell)
+        # Remove a random intersection from the frontier
+        root_cell = self.intersections.pop_random(self.rng)
+        slot = self.find_slot(root_cell, sample=self.weighted)
+        stats = self.stats
+        if stats is not None:
+            stats.new_word_attempts += 1
+            if slot is None:
+                stats.intersections_discarded += 1
+            else:
+                stats.new_word_successes += 1
+        if slot is None:
+            return None
+
+        (matches, orientation, start_row, start_col) = slot
+        choice = self.rng.choice(matches)
+        return Word(orientation, choice, start_row, start_col)
+
+    def find_slot(self, root_cell, sample=False):
+        """Finds the longest legal word that can be grown from an
+           intersection, shortening it until it has matches in the
+           dictionary. Returns a tuple of the matches, the orientation and
+           the start row and column, or None if there are no matches. If
+           sample is set, the matches are a single word drawn by frequency
+           rather than the full list"""
+        search = self._sample_match if sample else self._find_matches
         (start_row, start_col, orientation) = root_cell
 
         # Remember the original intersection point, as this must remain
@@ -114,7 +284,7 @@ class Crossword:
 
         # Create a list to hold the characters that will appear in the word,
         # and add the character at the intersection point to it.
-        candidate = [self.grid[original_row][original_col]]
+        candidate = [self.grid.get(original_row, original_col)]
 
         # Probe the existing crossword grid forwards, and then backwards, to
         # generate the longest possible word less than max_length than includes
@@ -124,7 +294,7 @@ class Crossword:
             while row < self.rows:
                 if self.check_cell_is_legal(row, start_col, row + 1,
                                             start_col, Orientation.VERTICAL):
-                    candidate.append(self.grid[row][start_col])
+                    candidate.append(self.grid.get(row, start_col))
                 else:
                     break
                 row += 1
@@ -132,7 +302,7 @@ class Crossword:
             while row >= 0:
                 if self.check_cell_is_legal(row, start_col, row - 1,
                                             start_col, Orientation.VERTICAL):
-                    candidate.insert(0, self.grid[row][start_col])
+                    candidate.insert(0, self.grid.get(row, start_col))
 
                     # Move the root row back to match the new legal start to
                     # the potential word.
@@ -145,7 +315,7 @@ class Crossword:
             while col < self.cols:
                 if self.check_cell_is_legal(start_row, col, start_row,
                                             col + 1, Orientation.HORIZONTAL):
-                    candidate.append(self.grid[start_row][col])
+                    candidate.append(self.grid.get(start_row, col))
                 else:
                     break
                 col += 1
@@ -153,7 +323,7 @@ class Crossword:
             while col >= 0:
                 if self.check_cell_is_legal(start_row, col, start_row,
                                             col - 1, Orientation.HORIZONTAL):
-                    candidate.insert(0, self.grid[start_row][col])
+                    candidate.insert(0, self.grid.get(start_row, col))
 
                     # Move the root column back to match the new legal start
                     # to the potential word.
@@ -174,7 +344,7 @@ class Crossword:
         # so ignore them.
         if len(candidate) < 3:
             return None
-        matches = find_matches(candidate, self.word_length_map, self.word_dict)
+        matches = search(candidate)
 
         # If there is no match, try removing characters from the candidate and
         # finding new matches If no shorter candidate is possible, return None
@@ -187,13 +357,34 @@ class Crossword:
                 start_col,
                 original_row,
                 original_col)
+            if self.stats is not None:
+                self.stats.trim_iterations += 1
             if shorter_candidate is None:
                 return None
-            matches = find_matches(shorter_candidate, self.word_length_map,
-                                   self.word_dict)
-
-        choice = random.choice(matches)
-        return Word(orientation, choice, start_row, start_col)
+            matches = search(shorter_candidate)
+
+        return matches, orientation, start_row, start_col
+
+    def _find_matches(self, candidate):
+        """Finds the dictionary words matching a candidate, recording the
+           search in the stats if they are being collected"""
+        matches = find_matches(candidate, self.word_length_map,
+                               self.word_dict, self.word_index,
+                               exclude=self.used_words)
+        if self.stats is not None:
+            self.stats.record_matches(len(matches))
+        return matches
+
+    def _sample_match(self, candidate):
+        """Draws one dictionary word matching a candidate, weighted by
+           frequency. Returns it in a list, which is empty if there are no
+           matches, so it can stand in for _find_matches"""
+        choice = self.word_index.sample_match(candidate, self.rng,
+                                              exclude=self.used_words)
+        matches = [] if choice is None else [choice]
+        if self.stats is not None:
+            self.stats.record_matches(len(matches))
+        return matches
 
     def trim_candidate(self, candidate, orientation, start_row,
                        start_col, original_row, original_col):
@@ -230,22 +421,27 @@ class Crossword:
         """Checks that the first and last characters of a candidate clue do not
            touch another clue without intersecting. If they do, the function
            removes the offending character(s)"""
+        cells = self.grid.cells
+        cols = self.cols
         if orientation == Orientation.HORIZONTAL:
-            if start_col > 0 and self.grid[start_row][start_col - 1] != '_':
+            position = start_row * cols + start_col
+            if start_col > 0 and cells[position - 1] != BLANK:
                 candidate.pop(0)
                 start_col += 1
-            at_edge = start_col + len(candidate) >= self.cols
-            if not at_edge and \
-                    self.grid[start_row][start_col + len(candidate)] != '_':
+                position += 1
+            at_edge = start_col + len(candidate) >= cols
+            if not at_edge and cells[position + len(candidate)] != BLANK:
                 candidate.pop()
             return candidate, start_row, start_col
         elif orientation == Orientation.VERTICAL:
-            if start_row > 0 and self.grid[start_row - 1][start_col] != '_':
+            position = start_row * cols + start_col
+            if start_row > 0 and cells[position - cols] != BLANK:
                 candidate.pop(0)
                 start_row += 1
+                position += cols
             at_edge = start_row + len(candidate) >= self.rows
             if not at_edge and \
-                    self.grid[start_row + len(candidate)][start_col] != '_':
+                    cells[position + len(candidate) * cols] != BLANK:
                 candidate.pop()
             return candidate, start_row, start_col
 
@@ -255,24 +451,24 @@ class Crossword:
         """Checks if the cell can be used as part of a new word in the
            crossword"""
 
+        cells = self.grid.cells
+        cols = self.cols
+
         # Check the next cell after this one to ensure that this candidate is
         # not running into another word running in the same orientation. If it
         # is, return False to ensure that neither cell will be added.
-        if orientation == Orientation.HORIZONTAL and self.cols > next_col >= 0:
-            across_use = self.letter_use[row][next_col] == LetterUse.ACROSS
-            both_use = self.letter_use[row][next_col] == LetterUse.BOTH
-            if across_use or both_use:
+        if orientation == Orientation.HORIZONTAL and cols > next_col >= 0:
+            if self.letter_use.cells[row * cols + next_col] & USE_ACROSS:
                 return False
         elif orientation == Orientation.VERTICAL and self.rows > next_row >= 0:
-            down_use = self.letter_use[next_row][col] == LetterUse.DOWN
-            both_use = self.letter_use[next_row][col] == LetterUse.BOTH
-            if down_use or both_use:
+            if self.letter_use.cells[next_row * cols + col] & USE_DOWN:
                 return False
 
         # If this cell already contains a letter, it is already part of a word
         # running in the orthogonal direction (we've checked for the parallel
         # direction above), so it is a legal cell in a potential new word,
-        if self.grid[row][col] != "_":
+        position = row * cols + col
+        if cells[position] != BLANK:
             return True
 
         # If this cell is blank, then the cells neighbouring it must be blank.
@@ -280,48 +476,43 @@ class Crossword:
         # existing word, thereby altering it.
         if orientation == Orientation.VERTICAL:
             has_cell_to_left = col > 0
-            has_cell_to_right = col < self.cols - 1
-            if has_cell_to_left and self.grid[row][col - 1] != "_":
+            has_cell_to_right = col < cols - 1
+            if has_cell_to_left and cells[position - 1] != BLANK:
                 return False
-            if has_cell_to_right and self.grid[row][col + 1] != "_":
+            if has_cell_to_right and cells[position + 1] != BLANK:
                 return False
         elif orientation == Orientation.HORIZONTAL:
             has_cell_above = row > 0
             has_cell_below = row < self.rows - 1
-            if has_cell_above and self.grid[row - 1][col] != "_":
+            if has_cell_above and cells[position - cols] != BLANK:
                 return False
-            if has_cell_below and self.grid[row + 1][col] != "_":
+            if has_cell_below and cells[position + cols] != BLANK:
                 return False
         return True
 
-    def add_word_to_grid(self, word, user_present=True):
+    def add_word_to_grid(self, word):
         """Adds a word to the crossword grid in the correct orientation"""
 
-        for i, _ in enumerate(word.string):
-            if word.orientation == Orientation.HORIZONTAL:
-                self.grid[word.start_row][word.start_col + i] = word.string[i]
-                self.user_guesses[word.start_row][word.start_col + i] = '*'
-                use = self.letter_use[word.start_row][word.start_col + i]
-                use = LetterUse.ACROSS if use == LetterUse.NONE \
-                    else LetterUse.BOTH
-                self.letter_use[word.start_row][word.start_col + i] = use
-            else:
-                self.grid[word.start_row + i][word.start_col] = word.string[i]
-                self.user_guesses[word.start_row + i][word.start_col] = '*'
-                use = self.letter_use[word.start_row + i][word.start_col]
-                use = LetterUse.DOWN if use == LetterUse.NONE \
-                    else LetterUse.BOTH
-                self.letter_use[word.start_row + i][word.start_col] = use
-
-        # Remove the word from the word_length_map dictionary so that it cannot
-        # appear twice. This prevents it appearing again in any crossword
-        # created in this instance of the program. Don't do this if there is
-        # no user present, as that means the crossword generator is being run
-        # repeatedly by a test, and may run out of words if they are being
-        # removed.
-        if user_present:
-            key = len(word.string)
-            self.word_length_map[key].remove(word.string)
+        # Work on the grid buffers directly. Along a row, consecutive letters
+        # are one cell apart, and down a column they are a row's width apart.
+        if word.orientation == Orientation.HORIZONTAL:
+            step = 1
+            new_use = USE_ACROSS
+        else:
+            step = self.cols
+            new_use = USE_DOWN
+        position = word.start_row * self.cols + word.start_col
+        use_cells = self.letter_use.cells
+        for char in word.string:
+            self.grid.cells[position] = ord(char)
+            self.user_guesses.cells[position] = ord('*')
+            use = use_cells[position]
+            use_cells[position] = new_use if use == USE_NONE else USE_BOTH
+            position += step
+
+        # Record the word as used so that it cannot appear twice in this
+        # crossword
+        self.used_words.add(word.string)
 
         # Calculate the new intersections on this word
         new_start_col = word.start_col
@@ -364,7 +555,7 @@ class Crossword:
            cell outside the crossword as being empty"""
         if row < 0 or col < 0 or row >= self.rows or col >= self.cols:
             return False
-        if self.grid[row][col] == '_':
+        if self.grid.cells[row * self.cols + col] == BLANK:
             return False
         return True
 
@@ -372,36 +563,94 @@ class Crossword:
         """Removes an intersection from the intersection set if the cell before
            or after it is unusable (already occupied or out of range). This
            prevents new words being added that touch, but do not intersect,
-           existing words in the crossword"""
-        temp_set = set()
-        for item in self.intersections:
-            (row, col, orientation) = item
-            cell_before_occupied = False
-            cell_after_occupied = False
-            if orientation == Orientation.HORIZONTAL:
-                if col == 0:
-                    cell_before_occupied = False
-                if col == self.cols - 1:
-                    cell_after_occupied = False
-                if col > 0 and self.grid[row][col - 1] != '_':
-                    cell_before_occupied = True
-                if col < self.cols - 2 and self.grid[row][col + 1] != '_':
-                    cell_after_occupied = True
-            elif orientation == Orientation.VERTICAL:
-                if row == 0:
-                    cell_before_occupied = False
-                if row == self.rows - 1:
-                    cell_after_occupied = False
-                if row > 0 and self.grid[row - 1][col] != '_':
-                    cell_before_occupied = True
-                if row < self.rows - 2 and self.grid[row + 1][col] != '_':
-                    cell_after_occupied = True
-
-            # Both cells must be usable in order for an intersection to be
-            # retained.
-            if not cell_before_occupied and not cell_after_occupied:
-                temp_set.add(item)
-        self.intersections = temp_set
+           existing words in the crossword. Generation prunes only around
+           each new word, with prune_intersections_around; this full rescan
+           is kept as the reference that the incremental prune is tested
+           against"""
+        unusable = [item for item in self.intersections
+                    if not self.intersection_is_usable(item)]
+        for item in unusable:
+            self.intersections.remove(item)
+
+    def prune_intersections_around(self, word):
+        """Removes the intersections made unusable by adding a word to the
+           grid. Only intersections beside the word's cells can be affected,
+           so only those are rechecked, rather than the whole set"""
+        stats = self.stats
+        if stats is not None:
+            start_time = perf_counter()
+            start_count = len(self.intersections)
+        for i in range(len(word.string)):
+            if word.orientation == Orientation.HORIZONTAL:
+                row = word.start_row
+                col = word.start_col + i
+            else:
+                row = word.start_row + i
+                col = word.start_col
+            neighbours = [(row, col - 1, Orientation.HORIZONTAL),
+                          (row, col + 1, Orientation.HORIZONTAL),
+                          (row - 1, col, Orientation.VERTICAL),
+                          (row + 1, col, Orientation.VERTICAL)]
+            for item in neighbours:
+                if item in self.intersections and \
+                        not self.intersection_is_usable(item):
+                    self.intersections.remove(item)
+        if stats is not None:
+            stats.prune_calls += 1
+            stats.prune_seconds += perf_counter() - start_time
+            stats.intersections_pruned += \
+                start_count - len(self.intersections)
+
+    def intersection_is_usable(self, item):
+        """Checks that the cells before and after an intersection, in the
+           direction of the word that would grow from it, are empty"""
+        (row, col, orientation) = item
+        cells = self.grid.cells
+        position = row * self.cols + col
+        cell_before_occupied = False
+        cell_after_occupied = False
+        if orientation == Orientation.HORIZONTAL:
+            if col > 0 and cells[position - 1] != BLANK:
+                cell_before_occupied = True
+            if col < self.cols - 2 and cells[position + 1] != BLANK:
+                cell_after_occupied = True
+        elif orientation == Orientation.VERTICAL:
+            if row > 0 and cells[position - self.cols] != BLANK:
+                cell_before_occupied = True
+            if row < self.rows - 2 and cells[position + self.cols] != BLANK:
+                cell_after_occupied = True
+
+        # Both cells must be usable in order for an intersection to be
+        # retained.
+        return not cell_before_occupied and not cell_after_occupied
+
+    def fill_ratio(self):
+        """Returns the proportion of the grid's cells that contain a
+           letter"""
+        cells = self.grid.cells
+        return 1 - cells.count(BLANK) / len(cells)
+
+    def snapshot(self):
+        """Captures the grids, intersections and clues, so that any words
+           added afterwards can be undone by passing the snapshot to
+           restore(). Each grid is captured with a single buffer copy"""
+        return (self.grid.copy(), self.letter_use.copy(),
+                self.user_guesses.copy(), self.intersections.copy(),
+                list(self.clues_across), list(self.clues_down),
+                list(self.placed_words), set(self.used_words))
+
+    def restore(self, snapshot):
+        """Returns the crossword to the state captured by snapshot()"""
+        (grid, letter_use, user_guesses, intersections,
+         clues_across, clues_down, placed_words, used_words) = snapshot
+        self.grid = grid.copy()
+        self.letter_use = letter_use.copy()
+        self.user_guesses = user_guesses.copy()
+        self.intersections = intersections.copy()
+        self.clues_across = list(clues_across)
+        self.clues_down = list(clues_down)
+        self.placed_words = list(placed_words)
+        self.used_words = set(used_words)
 
     def has_clue(self, index, orientation):
         """Returns true if a clue with the supplied index and orientation
@@ -467,7 +716,10 @@ class Crossword:
         for start_cell, clues_list in sorted(clues_dict.items()):
             if len(clues_list) > 1:
                 # There is an across clue and a down clue starting in the same
-                # cell.
+                # cell. They share an index, so skip any already given to a
+                # down clue
+                while across_counter in unusable_down_indices:
+                    across_counter += 1
                 for clue in clues_list:
                     if clue.orientation == Orientation.HORIZONTAL:
                         # Give the across clue its next index
@@ -504,52 +756,42 @@ class Crossword:
         self.clues_down = sorted(clues_down_reindexed, key=lambda cl: cl.index)
 
     def print(self, show_letters=True):
-        """Print the crossword to the terminal"""
-        dark_gray = Colors.get_background_color(0, 0, 0)
-        text_color = Colors.get_foreground_color(0, 0, 0)
+        """Print the crossword to the terminal. The screen is cleared the
+           first time, and afterwards only the squares that have changed
+           are written (see source/renderer.py)"""
+        self.draw_grid(show_letters)
+        self.frame_buffer.render()
+
+    def draw_grid(self, show_letters=True):
+        """Draws the crossword into the next frame. If show_letters is
+           False, each letter is replaced by a random one. These are not
+           taken from self.rng, so that dropping frames of the animation
+           cannot change the crossword generated from a seed"""
         origin_row = 4
         origin_col = 4
 
         for i, row in enumerate(self.grid):
-            display_chars = []
             for j, char in enumerate(row):
-                letter = None
-                color = get_alternating_square_color(i, j)
-                if show_letters:
-                    letter = get_large_letter(char)
-                else:
-                    rand = random.randint(97, 122)
-                    letter = get_large_letter(chr(rand))
+                letter = char
+                if not show_letters:
+                    letter = chr(random.randint(97, 122))
                 if char == '_':
-                    display_chars.append(f"{dark_gray}  "
-                                         f"{AnsiCommands.DEFAULT_COLOR}")
-                else:
-                    display_chars.append(f"{color}{text_color}{letter}"
-                                         f"{AnsiCommands.DEFAULT_COLOR}")
-            string = ''.join(display_chars)
-            sys.stdout.write(get_move_cursor_string(origin_col,
-                                                    origin_row + i))
-            sys.stdout.write(string)
-        sys.stdout.flush()
-
-    def print_welcome_message(self):
-        """Prints a simple welcome message to show while the crossword
-           generation animation is running"""
+                    letter = '_'
+                self.frame_buffer.draw_cell(origin_col + j * 2,
+                                            origin_row + i,
+                                            SQUARES[((i + j) % 2, letter,
+                                                     False)])
+
+    def draw_welcome_message(self):
+        """Draws a simple welcome message into the next frame, to show while
+           the crossword generation animation is running"""
+        style = Colors.FOREGROUND_BLUE + AnsiCommands.BOLD
         title = "crossword generator"
-        row = 6
+        glyphs = ["  " if char == " " else get_large_letter(char)
+                  for char in title]
         col = 4 + (self.cols * 2) + 4
-        sys.stdout.write(Colors.FOREGROUND_BLUE)
-        sys.stdout.write(AnsiCommands.BOLD)
-        for index, char in enumerate(title):
-            glyph = " " if char == " " else get_large_letter(char)
-            sys.stdout.write(get_move_cursor_string(col + index * 2, row))
-            sys.stdout.write(glyph)
-        sys.stdout.flush()
+        self.frame_buffer.draw(col, 6, ''.join(glyphs), style)
 
         message = "Creating your crossword ..."
-        row = 8
         col = 4 + (self.cols * 2) + 6
-        for index, char in enumerate(message):
-            sys.stdout.write(get_move_cursor_string(col + index, row))
-            sys.stdout.write(char)
-        sys.stdout.flush()
+        self.frame_buffer.draw(col, 8, message, style)
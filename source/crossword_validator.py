@@ -1,154 +1,256 @@
+"""
+Checks that a crossword obeys the rules of its construction, returning a
+report of every violation found rather than printing them.
+
+The clues are checked in a single pass, each against the packed grid: the
+letters of a clue are read from the grid's buffer with one slice. Groups of
+2x2 occupied cells are found in large grids with a sliding-window sum over a
+NumPy view of the grid, if NumPy is installed. Otherwise, and for small
+grids, where it is faster, bitmasks of the occupied cells in neighbouring
+rows are AND-ed together.
+
+Violations can be gathered from a run over many crosswords into a
+ValidationSummary, a table of every violation with the failure rate of each
+rule.
+"""
+import csv
+
 from source.constants import Orientation
+from source.grid import BLANK
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The rules a crossword is checked against
+GRID_2X2 = "2x2 group"
+CLUE_MISMATCH = "clue does not match grid"
+ADJACENT_CLUE = "adjacent clue"
+UNKNOWN_WORD = "word not in dictionary"
+DUPLICATE_INDEX = "duplicate clue index"
+RULES = [GRID_2X2, CLUE_MISMATCH, ADJACENT_CLUE, UNKNOWN_WORD,
+         DUPLICATE_INDEX]
+
+# Below this number of cells, the bitmasks find 2x2 groups faster than NumPy
+NUMPY_MIN_CELLS = 1024
+
+# Translates the bytes of a grid to the ASCII digit '1' for an occupied cell
+# and '0' for an empty one
+_OCCUPIED_DIGITS = bytes(ord('0') if byte == BLANK else ord('1')
+                         for byte in range(256))
+
+
+class Violation:
+    """A single broken rule, with the cell where it was found and the string
+       of the clue involved, if any"""
+
+    def __init__(self, rule, message, row, col, clue=None):
+        self.rule = rule
+        self.message = message
+        self.row = row
+        self.col = col
+        self.clue = clue
+
+    def __str__(self):
+        return self.message
+
+
+class ValidationReport:
+    """The violations found in a crossword. A report is true if there are
+       none"""
+
+    def __init__(self):
+        self.violations = []
+
+    def add(self, rule, message, row, col, clue=None):
+        """Records a violation"""
+        self.violations.append(Violation(rule, message, row, col, clue))
+
+    @property
+    def valid(self):
+        """True if no rule was broken"""
+        return not self.violations
+
+    def __bool__(self):
+        return self.valid
+
+    def counts(self):
+        """Returns the number of violations of each rule"""
+        counts = dict.fromkeys(RULES, 0)
+        for violation in self.violations:
+            counts[violation.rule] += 1
+        return counts
+
+    def __str__(self):
+        return '\n'.join(str(violation) for violation in self.violations)
 
 
 def validate(crossword):
     """Performs a suite of tests on a crossword, returning True if all
        pass, False otherwise"""
-    crossword.print()
-    print()
+    return check_crossword(crossword).valid
 
-    print("Checking for 2x2 groups of occupied cells")
-    result = check_for_2x2_groups(crossword)
-    if result:
-        print("  ... All groups valid")
-    else:
-        return False
 
-    result = check_clue_strings_match_grid(crossword)
-    if result:
-        print("  ...All clues match grid")
-    else:
-        return False
+def check_crossword(crossword):
+    """Checks a crossword against every rule, returning a
+       ValidationReport"""
+    report = ValidationReport()
+    check_for_2x2_groups(crossword, report)
+    check_clues(crossword, report)
+    return report
 
-    result = check_no_adjacent_clues(crossword)
-    if result:
-        print("  ...No adjacent clues found")
-    else:
-        return False
 
-    result = check_all_clues_appear_in_dictionary(crossword)
-    if result:
-        print("  ...all clues appear in dictionary")
+def check_for_2x2_groups(crossword, report):
+    """Reports every 2x2 group of cells that are all occupied. If such a
+       group is full, it means that there are at least 2 clues running
+       parallel to each other 1 square apart, which generates a number of
+       extra unwanted 2-letter words"""
+    if numpy is not None and len(crossword.grid.cells) >= NUMPY_MIN_CELLS:
+        groups = _find_2x2_groups_numpy(crossword.grid)
     else:
-        return False
-
-    result = check_all_clue_indices_are_unique(crossword)
-    if result:
-        print(" ...all clue indices are unique")
-
-    return True
-
-
-def check_for_2x2_groups(crossword):
-    """Test ensures that no 2x2 group of contiguous cells are all occupied.
-       If such a group is full, it means that there are at least 2 clues
-       running parallel to each other 1 square apart, which generates a
-       number of extra unwanted 2-letter words"""
-    for i in range(crossword.rows - 1):
-        for j in range(crossword.cols - 1):
-            group = [crossword.grid[i][j],
-                     crossword.grid[i][j + 1],
-                     crossword.grid[i + 1][j],
-                     crossword.grid[i + 1][j + 1]]
-            if '_' not in group:
-                print(f"Illegal 2x2 group found starting on row {i}, col {j}")
-                return False
-    return True
-
-
-def check_clue_strings_match_grid(crossword):
-    """Test ensures that all clue strings are represented accurately on the
-       crossword grid. This would not be the case if a clue had overwritten
-       the letters in another clue"""
-    clues = crossword.clues_across + crossword.clues_down
-    for clue in clues:
+        groups = _find_2x2_groups_bitmask(crossword.grid)
+    for (row, col) in groups:
+        report.add(GRID_2X2, f"Illegal 2x2 group found starting on row "
+                             f"{row}, col {col}", row, col)
+
+
+def _find_2x2_groups_numpy(grid):
+    """Returns the top left cells of full 2x2 groups, found by summing each
+       2x2 window of a zero-copy view of the grid"""
+    occupied = numpy.frombuffer(grid.cells, dtype=numpy.uint8) \
+        .reshape(grid.rows, grid.cols) != BLANK
+    occupied = occupied.astype(numpy.uint8)
+    windows = occupied[:-1, :-1] + occupied[:-1, 1:] + \
+        occupied[1:, :-1] + occupied[1:, 1:]
+    return [(int(row), int(col))
+            for (row, col) in numpy.argwhere(windows == 4)]
+
+
+def _find_2x2_groups_bitmask(grid):
+    """Returns the top left cells of full 2x2 groups. Each row is turned into
+       an integer with a bit set for each occupied cell, so a full group is
+       a bit set in two neighbouring rows and in the next column of both"""
+    cols = grid.cols
+    digits = grid.cells.translate(_OCCUPIED_DIGITS)
+    masks = [int(digits[start:start + cols][::-1], 2)
+             for start in range(0, grid.rows * cols, cols)]
+    groups = []
+    for row in range(grid.rows - 1):
+        pairs = masks[row] & masks[row + 1]
+        squares = pairs & (pairs >> 1)
+        while squares:
+            lowest = squares & -squares
+            groups.append((row, lowest.bit_length() - 1))
+            squares ^= lowest
+    return groups
+
+
+def check_clues(crossword, report):
+    """Checks every clue in one pass, reporting any clue whose string is not
+       represented accurately on the grid (as when a clue has overwritten
+       the letters of another), that touches another clue without
+       intersecting it, that is not in the dictionary, or that shares its
+       index with another clue of the same orientation"""
+    cells = crossword.grid.cells
+    # The word index answers membership without searching the dictionary
+    words = crossword.word_index if crossword.word_index is not None \
+        else crossword.word_dict
+    rows = crossword.rows
+    cols = crossword.cols
+    indices = {Orientation.HORIZONTAL: set(), Orientation.VERTICAL: set()}
+    for clue in crossword.clues_across + crossword.clues_down:
+        string = clue.string
+        length = len(string)
         if clue.orientation == Orientation.HORIZONTAL:
-            row = clue.start_row
-            for i, char in enumerate(clue.string):
-                col = clue.start_col
-                grid_char = crossword.grid[row][col + i]
-                if char != grid_char:
-                    print(f"Characters do not match at row {row}, "
-                          f"col {col + i} for {clue.string}")
-                    print(f"clue[{i}] == {clue.string[i]} , "
-                          f"grid[{row}][{col + i}] == {grid_char}")
-                    return False
-        elif clue.orientation == Orientation.VERTICAL:
-            col = clue.start_col
-            for i, char in enumerate(clue.string):
-                row = clue.start_row
-                grid_char = crossword.grid[row + i][col]
+            (step, first, limit) = (1, clue.start_col, cols)
+        else:
+            (step, first, limit) = (cols, clue.start_row, rows)
+        start = clue.start_row * cols + clue.start_col
+        end = start + step * length
+
+        letters = cells[start:end:step]
+        if first + length > limit or letters != string.encode('ascii'):
+            for i, char in enumerate(string):
+                position = start + i * step
+                grid_char = '' if i >= len(letters) else chr(letters[i])
                 if char != grid_char:
-                    print(f"Characters do not match at row {row + i}, "
-                          f"col {col} for {clue.string}")
-                    print(f"clue[{i}] == {clue.string[i]} , "
-                          f"grid[{row + i}][{col}] == {grid_char}")
-                    return False
-    return True
-
-
-def check_no_adjacent_clues(crossword):
-    """Test ensures that no clue touches another without intersecting it"""
-    clues = crossword.clues_across + crossword.clues_down
-    for clue in clues:
-        if clue.orientation == Orientation.HORIZONTAL:
-            # The cells bookending the clue must be blank
-            row = clue.start_row
-            length = len(clue.string)
-            if clue.start_col > 0:
-                if crossword.grid[row][clue.start_col - 1] != '_':
-                    print(f"{clue.string} touches another clue at {row},"
-                          f"{clue.start_col - 1}")
-                    return False
-            if clue.start_col + length < crossword.cols - 1:
-                if crossword.grid[row][clue.start_col + length] != '_':
-                    print(f"{clue.string} touches another clue at {row},"
-                          f"{clue.start_col + length}")
-                    return False
-        elif clue.orientation == Orientation.VERTICAL:
-            # The cells bookending the clue must be blank
-            col = clue.start_col
-            length = len(clue.string)
-            if clue.start_row > 0:
-                if crossword.grid[clue.start_row - 1][col] != '_':
-                    print(f"{clue.string} touches another clue at "
-                          f"{clue.start_row - 1},{col}")
-                    return False
-            if clue.start_row + length < crossword.rows - 1:
-                if crossword.grid[clue.start_row + length][col] != '_':
-                    print(f"{clue.string} touches another clue at "
-                          f"{clue.start_row + length},{col}")
-                    return False
-    return True
-
-
-def check_all_clues_appear_in_dictionary(crossword):
-    """Test confirms that all clue strings do in fact appear in the
-       dictionary"""
-    clues = crossword.clues_across + crossword.clues_down
-    for clue in clues:
-        if clue.string not in crossword.word_dict:
-            print(f"The clue '{clue.string}' does not "
-                  f"appear in the dictionary")
-            return False
-    return True
-
-
-def check_all_clue_indices_are_unique(crossword):
-    """Test confirms that no clue index appears twice in either the
-       clues_across or clues_down lists"""
-    if len(set(crossword.clues_across)) < len(crossword.clues_across):
-        print("Duplicate across clue indices:")
-        for clue in crossword.clues_across:
-            print(clue.index)
-        return False
-    if len(set(crossword.clues_down)) < len(crossword.clues_down):
-        print("Duplicate down clue indices:")
-        for clue in crossword.clues_down:
-            print(clue.index)
-        return False
-    return True
-
-
-if __name__ == '__main__':
-    multiple_crossword_validate()
+                    (row, col) = divmod(position, cols)
+                    report.add(CLUE_MISMATCH,
+                               f"Characters do not match at row {row}, col "
+                               f"{col} for {string}: clue[{i}] == {char}, "
+                               f"grid == {grid_char or 'off the grid'}",
+                               row, col, string)
+                    break
+
+        # The cells bookending the clue must be blank
+        for (position, inside) in ((start - step, first > 0),
+                                   (end, first + length < limit)):
+            if inside and cells[position] != BLANK:
+                (row, col) = divmod(position, cols)
+                report.add(ADJACENT_CLUE, f"{string} touches another clue "
+                                          f"at {row},{col}", row, col, string)
+
+        if string not in words:
+            report.add(UNKNOWN_WORD, f"The clue '{string}' does not appear "
+                                     f"in the dictionary",
+                       clue.start_row, clue.start_col, string)
+
+        if clue.index in indices[clue.orientation]:
+            report.add(DUPLICATE_INDEX,
+                       f"Duplicate {clue.orientation.value.lower()} clue "
+                       f"index {clue.index}", clue.start_row, clue.start_col,
+                       string)
+        indices[clue.orientation].add(clue.index)
+
+
+class ValidationSummary:
+    """Gathers the violations found in a run over many crosswords. Each
+       violation is kept as a row of a table, and the number of crosswords
+       breaking each rule is counted, so that failure rates can be reported
+       without keeping the crosswords themselves"""
+    COLUMNS = ('number', 'seed', 'rule', 'row', 'col', 'clue')
+
+    def __init__(self):
+        self.puzzles = 0
+        self.invalid = 0
+        self.rule_puzzles = dict.fromkeys(RULES, 0)
+        self.rule_violations = dict.fromkeys(RULES, 0)
+        self.table = []
+
+    def add(self, number, seed, valid, violations):
+        """Records the result of validating crossword number, generated
+           from seed"""
+        self.puzzles += 1
+        if not valid:
+            self.invalid += 1
+        for rule in {violation.rule for violation in violations}:
+            self.rule_puzzles[rule] += 1
+        for violation in violations:
+            self.rule_violations[violation.rule] += 1
+            self.table.append((number, seed, violation.rule, violation.row,
+                               violation.col, violation.clue))
+
+    def failure_rate(self, rule=None):
+        """Returns the proportion of crosswords that were invalid, or that
+           broke a particular rule"""
+        if not self.puzzles:
+            return 0.0
+        failures = self.invalid if rule is None else self.rule_puzzles[rule]
+        return failures / self.puzzles
+
+    def write_table(self, path):
+        """Writes the table of violations to a csv file"""
+        with open(path, 'w', encoding='utf-8', newline='') as outfile:
+            writer = csv.writer(outfile)
+            writer.writerow(self.COLUMNS)
+            writer.writerows(self.table)
+
+    def __str__(self):
+        lines = [f"{self.puzzles} crosswords, {self.invalid} invalid "
+                 f"({self.failure_rate():.2%})"]
+        for rule in RULES:
+            lines.append(f"  {rule}: {self.rule_violations[rule]} "
+                         f"violations in {self.rule_puzzles[rule]} "
+                         f"crosswords ({self.failure_rate(rule):.2%})")
+        return '\n'.join(lines)
@@ -0,0 +1,126 @@
+"""
+A backtracking alternative to the greedy growth in Crossword.generate_words.
+
+Each intersection in the crossword's frontier is treated as a slot, whose
+possible values are the dictionary words matching the longest legal word
+that can be grown from it. At every step the most constrained slot - the
+one with the fewest matches - is filled first. Slots left with no matches
+are dropped, as they are by the greedy generator. When the frontier runs
+out, the grid must have reached a minimum fill ratio; if it has not, the
+search backtracks and tries other words, or leaves a slot empty. Backtracking
+mostly revisits the last few words, so after a few failures the search
+restarts from a new first word, until its budget of backtracks is spent. The
+densest grid seen is kept if the target is never reached.
+"""
+from source.utilities import Word
+
+MIN_FILL_RATIO = 0.6
+MAX_BACKTRACKS = 200
+RESTART_AFTER = 20
+BRANCHING = 3
+
+
+class BacktrackingFiller:
+    """Fills an empty crossword"""
+
+    def __init__(self, crossword, min_fill_ratio=MIN_FILL_RATIO,
+                 max_backtracks=MAX_BACKTRACKS, branching=BRANCHING,
+                 restart_after=RESTART_AFTER):
+        self.crossword = crossword
+        self.min_fill_ratio = min_fill_ratio
+        self.max_backtracks = max_backtracks
+        self.branching = branching
+        self.restart_after = restart_after
+        self.backtracks = 0
+        self.attempt_backtracks = 0
+        self.best_fill_ratio = -1
+        self.best_snapshot = None
+
+    def fill(self):
+        """Runs the search, leaving the crossword in the best state found.
+           At least one attempt is made, however small the budget of
+           backtracks. Returns True if the minimum fill ratio was reached"""
+        empty = self.crossword.snapshot()
+        while True:
+            self.crossword.restore(empty)
+            self.crossword.add_first_word()
+            self.attempt_backtracks = 0
+            if self._search():
+                return True
+            if self.backtracks >= self.max_backtracks:
+                break
+        # Every attempt scores at least one grid, but if none was kept the
+        # crossword is left as the last attempt left it
+        if self.best_snapshot is not None:
+            self.crossword.restore(self.best_snapshot)
+        return False
+
+    def _search(self):
+        """Fills the most constrained slot with each of a few candidate
+           words in turn, recursing after each, and then tries leaving it
+           empty. Returns True once a complete grid reaches the minimum fill
+           ratio"""
+        crossword = self.crossword
+        while True:
+            slots = self._live_slots()
+            if not slots:
+                return self._finish_branch()
+
+            # Slots are compared in frontier order, so ties are broken in
+            # the same way for the same seed.
+            (root_cell, matches, orientation, start_row, start_col) = \
+                min(slots, key=lambda slot: len(slot[1]))
+            choices = crossword.rng.sample(matches,
+                                           min(self.branching, len(matches)))
+
+            snapshot = crossword.snapshot()
+            crossword.intersections.remove(root_cell)
+            for choice in choices:
+                word = Word(orientation, choice, start_row, start_col)
+                crossword.add_word_to_grid(word)
+                crossword.add_word_to_clues(word)
+                crossword.prune_intersections_around(word)
+                if self._search():
+                    return True
+                crossword.restore(snapshot)
+                crossword.intersections.remove(root_cell)
+                if self.backtracks >= self.max_backtracks or \
+                        self.attempt_backtracks >= self.restart_after:
+                    return False
+
+            # None of the words led to a good enough grid, so carry on with
+            # this slot left empty
+
+    def _finish_branch(self):
+        """Scores a grid with no slots left to fill, remembering it if it is
+           the densest so far. Returns True if it is dense enough"""
+        fill_ratio = self.crossword.fill_ratio()
+        if fill_ratio > self.best_fill_ratio:
+            self.best_fill_ratio = fill_ratio
+            self.best_snapshot = self.crossword.snapshot()
+        if fill_ratio >= self.min_fill_ratio:
+            return True
+        self.backtracks += 1
+        self.attempt_backtracks += 1
+        return False
+
+    def _live_slots(self):
+        """Returns the slots in the frontier that still have matches, as
+           tuples of the intersection, the matches, the orientation and the
+           start row and column. Intersections without matches are removed
+           from the frontier"""
+        crossword = self.crossword
+        slots = []
+        dead = []
+        for root_cell in crossword.intersections:
+            slot = crossword.find_slot(root_cell)
+            if slot is not None:
+                (matches, orientation, start_row, start_col) = slot
+                if matches:
+                    slots.append((root_cell, matches, orientation,
+                                  start_row, start_col))
+                    continue
+            dead.append(root_cell)
+        for root_cell in dead:
+            crossword.intersections.remove(root_cell)
+        return slots
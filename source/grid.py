@@ -0,0 +1,172 @@
+from source.constants import LetterUse
+
+# The byte stored in a LetterGrid for an empty cell
+BLANK = ord('_')
+
+# The bits stored in a UseGrid for the orientations of the words using a cell
+USE_NONE = 0
+USE_ACROSS = 1
+USE_DOWN = 2
+USE_BOTH = USE_ACROSS | USE_DOWN
+
+
+class PackedGrid:
+    """A rectangular grid packed into a flat bytearray, one byte per cell,
+       row by row. Indexing the grid with a row number returns a view of
+       that row, so cells can still be read and written as grid[row][col].
+       Code in the inner loops of the generator uses the cells bytearray
+       directly, at index row * cols + col"""
+
+    def __init__(self, rows, cols, cells):
+        self.rows = rows
+        self.cols = cols
+        self.cells = cells
+
+    @classmethod
+    def from_buffer(cls, rows, cols, cells):
+        """Returns a grid of this class over an existing buffer of cells,
+           such as a slice of a memoryview, without copying it"""
+        grid = cls.__new__(cls)
+        PackedGrid.__init__(grid, rows, cols, cells)
+        return grid
+
+    def _encode(self, value):
+        """Converts a cell value to the byte stored for it"""
+        raise NotImplementedError
+
+    def _decode(self, byte):
+        """Converts a stored byte back to a cell value"""
+        raise NotImplementedError
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += self.rows
+        if not 0 <= row < self.rows:
+            raise IndexError("grid row out of range")
+        return GridRow(self, row)
+
+    def __iter__(self):
+        for row in range(self.rows):
+            yield GridRow(self, row)
+
+    def __eq__(self, other):
+        if isinstance(other, PackedGrid):
+            return type(self) is type(other) and self.rows == other.rows \
+                and self.cols == other.cols and self.cells == other.cells
+        if isinstance(other, list):
+            return self.to_lists() == other
+        return NotImplemented
+
+    def get(self, row, col):
+        """Returns the value of a single cell"""
+        return self._decode(self.cells[row * self.cols + col])
+
+    def set(self, row, col, value):
+        """Sets the value of a single cell"""
+        self.cells[row * self.cols + col] = self._encode(value)
+
+    def to_lists(self):
+        """Returns the grid as a list of lists of cell values"""
+        return [list(row) for row in self]
+
+    def copy(self):
+        """Returns an independent copy of the grid, made with a single copy
+           of the underlying buffer"""
+        clone = self.__class__.__new__(self.__class__)
+        clone.rows = self.rows
+        clone.cols = self.cols
+        clone.cells = bytearray(self.cells)
+        return clone
+
+
+class LetterGrid(PackedGrid):
+    """A grid of single ASCII characters"""
+
+    def __init__(self, rows, cols, fill='_'):
+        super().__init__(rows, cols, bytearray([ord(fill)]) * (rows * cols))
+
+    def _encode(self, value):
+        return ord(value)
+
+    def _decode(self, byte):
+        return chr(byte)
+
+    def row_string(self, row):
+        """Returns the characters of one row as a string"""
+        start = row * self.cols
+        return str(self.cells[start:start + self.cols], 'ascii')
+
+
+class UseGrid(PackedGrid):
+    """A grid recording which orientations of word use each cell, stored as
+       a bitfield but read and written as LetterUse values"""
+
+    _TO_BITS = {LetterUse.NONE: USE_NONE,
+                LetterUse.ACROSS: USE_ACROSS,
+                LetterUse.DOWN: USE_DOWN,
+                LetterUse.BOTH: USE_BOTH}
+    _FROM_BITS = [LetterUse.NONE, LetterUse.ACROSS,
+                  LetterUse.DOWN, LetterUse.BOTH]
+
+    def __init__(self, rows, cols):
+        super().__init__(rows, cols, bytearray(rows * cols))
+
+    def _encode(self, value):
+        return self._TO_BITS[value]
+
+    def _decode(self, byte):
+        return self._FROM_BITS[byte]
+
+
+class GridRow:
+    """A view of one row of a PackedGrid, which reads and writes the grid's
+       buffer directly"""
+    __slots__ = ('_grid', '_start')
+
+    def __init__(self, grid, row):
+        self._grid = grid
+        self._start = row * grid.cols
+
+    def _position(self, col):
+        """Converts a column, which may be negative, to a buffer index"""
+        cols = self._grid.cols
+        if col < 0:
+            col += cols
+        if not 0 <= col < cols:
+            raise IndexError("grid column out of range")
+        return self._start + col
+
+    def __len__(self):
+        return self._grid.cols
+
+    def __getitem__(self, col):
+        grid = self._grid
+        if isinstance(col, slice):
+            return [grid._decode(byte) for byte in
+                    grid.cells[self._start:self._start + grid.cols][col]]
+        return grid._decode(grid.cells[self._position(col)])
+
+    def __setitem__(self, col, value):
+        grid = self._grid
+        if isinstance(col, slice):
+            columns = range(grid.cols)[col]
+            values = list(value)
+            if len(columns) != len(values):
+                raise ValueError("a grid row cannot change length")
+            for column, item in zip(columns, values):
+                grid.cells[self._start + column] = grid._encode(item)
+        else:
+            grid.cells[self._position(col)] = grid._encode(value)
+
+    def __iter__(self):
+        grid = self._grid
+        for byte in grid.cells[self._start:self._start + grid.cols]:
+            yield grid._decode(byte)
+
+    def __eq__(self, other):
+        if isinstance(other, (GridRow, list)):
+            return list(self) == list(other)
+        return NotImplemented
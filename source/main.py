@@ -1,148 +1,451 @@
+"""
+Builds the crossword dictionary from the source word lists.
+
+The build is a pipeline of generators, so the source dictionary is never
+held in memory as a whole. The source file is split into shards by byte
+range, and a pool of worker processes each parses and filters the lines of
+one shard, joins them with the word frequencies, and sorts them in bounded
+chunks written to disk. The chunks of every shard are then merged, grouped
+into one entry per word, and written to crossword_dictionary.json one entry
+at a time. The merged order depends only on the records, never on how the
+file was sharded, so the output is the same for any number of workers. Only
+the frequency table, which is limited to the most common words, and one
+chunk of the sort per worker are ever held in memory.
+
+After a full build, the dictionary can be brought up to date with changes
+to the source files by an incremental update. The source lines and
+frequencies are hashed in chunks, one for each two-letter prefix of the
+words, and the hashes are saved in a manifest beside the dictionary. An
+update reprocesses only the lines of the chunks whose hashes have changed,
+and patches the words of those chunks into the compiled dictionary, whose
+version number is increased by one.
+"""
+import hashlib
+import heapq
+import itertools
 import json
+import multiprocessing
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from source.compiled_dictionary import (CompiledDictionary,
+                                            read_dictionary_version,
+                                            write_compiled_dictionary)
+except ModuleNotFoundError:
+    from compiled_dictionary import (CompiledDictionary,
+                                     read_dictionary_version,
+                                     write_compiled_dictionary)
+
+SOURCE_DICTIONARY = '../data/large_dictionary_2.txt'
+SORTED_WORDS = '../data/large_dict_words_only.txt'
+SOURCE_FREQUENCIES = '../data/enwiki-20210820-words-frequency.txt'
+FILTERED_FREQUENCIES = '../data/wiki-words-freq1000+.txt'
+DICTIONARY_JSON = '../data/crossword_dictionary.json'
+DICTIONARY_COMPILED = '../data/crossword_dictionary.bin'
+DICTIONARY_MANIFEST = '../data/crossword_dictionary.manifest.json'
+
+# Source lines are hashed in chunks by the first letters of their word
+CHUNK_PREFIX_LENGTH = 2
 
+# Words less frequent than this on Wikipedia are left out of the dictionary
+MIN_FREQUENCY = 100000
 
-def main():
+# The number of (word, definition) records sorted in memory at once. Larger
+# sources are sorted in chunks of this size, which are merged from disk.
+SORT_CHUNK_SIZE = 200000
+
+# Populated in the parent process, and inherited by the forked workers
+_shared = {}
+
+
+def main(dictionary_path=SOURCE_DICTIONARY, frequency_path=SOURCE_FREQUENCIES,
+         output_path=DICTIONARY_JSON, sorted_words_path=SORTED_WORDS,
+         filtered_frequency_path=FILTERED_FREQUENCIES,
+         chunk_size=SORT_CHUNK_SIZE, workers=None):
     """Assembles the word list and the frequency list, and uses these to
        create a dictionary keyed by word, with a list of frequency and
-       definitions as values"""
-    word_list = load_large_dictionary()
-    print(f"Word_list loaded with {len(word_list)} entries")
-
-    frequency_dict = load_word_frequencies()
-    frequency_keys = frequency_dict.keys()
-    print(f"Frequency dict loaded with {len(frequency_keys)} entries")
-
-    # Words in the word_list are often duplicated, with differing definitions.
-    # Create a dictionary with words as keys, and a list (containing both the
-    # frequency of the word and a list of its definitions) as the value
-
-    word_dict = {}
-    previous_word = ""
-    total_count = 0
-    unique_count = 0
-    not_in_freq_dict_count = 0
-    for item in word_list:
-        word = item[0]
-        definition = item[1]
-        if word not in frequency_keys:
-            not_in_freq_dict_count += 1
-            continue
-        if word != previous_word:
-            word_dict[word] = []
-            frequency = frequency_dict[word]
-            word_dict[word].append(frequency)
-            word_dict[word].append([])
-            word_dict[word][1].append(definition)
-            unique_count += 1
-            total_count += 1
-
-        else:
-            word_dict[word][1].append(definition)
-            total_count += 1
-        previous_word = word
+       definitions as values. The source dictionary is filtered by a pool
+       of worker processes, one for each core unless workers is given"""
+    frequency_dict = load_word_frequencies(frequency_path,
+                                           filtered_frequency_path)
+    print(f"Frequency dict loaded with {len(frequency_dict)} entries")
 
+    counts = {'of': 0, 'contains_word': 0, 'total': 0,
+              'not_in_frequency_dict': 0, 'unique': 0}
+    with tempfile.TemporaryDirectory() as sort_directory:
+        chunk_paths = ingest_shards(dictionary_path, frequency_dict, counts,
+                                    sort_directory, chunk_size, workers)
+        records = merge_chunks(chunk_paths)
+        records = write_sorted_words(records, sorted_words_path)
+
+        # Words in the word list are often duplicated, with differing
+        # definitions. Group them into one entry per word, holding the
+        # frequency of the word and a list of its definitions
+        records = drop_unknown_words(records, counts)
+        entries = group_definitions(records, counts)
+        write_json_dictionary(entries, output_path)
+
+    print(f"Of exclusions : {counts['of']}")
+    print(f"Contains word exclusions : {counts['contains_word']}")
     print(
-        f"Dictionary created : {unique_count} unique, {total_count} total,"
-        f"{not_in_freq_dict_count} not in frequency dict")
+        f"Dictionary created : {counts['unique']} unique, "
+        f"{counts['total']} total, "
+        f"{counts['not_in_frequency_dict']} not in frequency dict")
+
+
+def compile_dictionary(json_path=DICTIONARY_JSON,
+                       compiled_path=DICTIONARY_COMPILED,
+                       dictionary_version=None):
+    """Compiles crossword_dictionary.json into the binary format that is
+       memory-mapped by the game at startup. Run this after main() whenever
+       the json dictionary changes. Unless a dictionary_version is given,
+       the version of the existing compiled dictionary is increased by
+       one"""
+    if dictionary_version is None:
+        dictionary_version = read_dictionary_version(compiled_path) + 1
+    with open(json_path, 'r', encoding='utf-8') as infile:
+        word_dict = json.load(infile)
+    _replace_file(compiled_path, lambda path: write_compiled_dictionary(
+        word_dict, path, dictionary_version, json_path))
+    print(f"Compiled dictionary version {dictionary_version} written with "
+          f"{len(word_dict)} entries")
+
+
+def update_dictionary(dictionary_path=SOURCE_DICTIONARY,
+                      frequency_path=SOURCE_FREQUENCIES,
+                      json_path=DICTIONARY_JSON,
+                      compiled_path=DICTIONARY_COMPILED,
+                      manifest_path=DICTIONARY_MANIFEST,
+                      sorted_words_path=SORTED_WORDS,
+                      filtered_frequency_path=FILTERED_FREQUENCIES,
+                      workers=None):
+    """Brings the json and compiled dictionaries up to date with the source
+       files, reprocessing only the chunks of the source whose hashes differ
+       from those in the manifest. Without a manifest matching the compiled
+       dictionary, a full build is run instead. Returns the version of the
+       compiled dictionary"""
+    frequency_dict = load_word_frequencies(frequency_path,
+                                           filtered_frequency_path)
+    hashes = hash_source_chunks(dictionary_path, frequency_dict)
+    manifest = read_manifest(manifest_path)
+    version = 0 if manifest is None else manifest['dictionary_version']
+    if manifest is None or \
+            read_dictionary_version(compiled_path) != version:
+        main(dictionary_path, frequency_path, json_path, sorted_words_path,
+             filtered_frequency_path, workers=workers)
+        compile_dictionary(json_path, compiled_path, version + 1)
+        write_manifest(manifest_path, version + 1, hashes)
+        return version + 1
+
+    chunks = manifest['chunks']
+    changed = {key for key in hashes.keys() | chunks.keys()
+               if hashes.get(key) != chunks.get(key)}
+    if not changed:
+        print(f"Dictionary version {version} is up to date")
+        return version
+
+    # Rebuild the entries of the changed chunks from their source lines
+    counts = {'of': 0, 'contains_word': 0, 'total': 0,
+              'not_in_frequency_dict': 0, 'unique': 0}
+    with open(dictionary_path, 'r', encoding='utf-8') as infile:
+        lines = (line for line in infile
+                 if chunk_key(line.split(',', 1)[0]) in changed)
+        records = parse_large_dictionary(lines, counts)
+        records = sorted(join_frequencies(records, frequency_dict))
+    records = drop_unknown_words(records, counts)
+    word_dict = dict(group_definitions(records, counts))
 
+    # Keep the entries of every other chunk from the compiled dictionary
+    compiled = CompiledDictionary(compiled_path)
+    for word in compiled:
+        if chunk_key(word) not in changed:
+            entry = compiled[word]
+            word_dict[word] = [entry[0], entry[1]]
+    del compiled
+
+    entries = sorted(word_dict.items())
+    _replace_file(json_path,
+                  lambda path: write_json_dictionary(entries, path))
+    _replace_file(compiled_path, lambda path: write_compiled_dictionary(
+        word_dict, path, version + 1, json_path))
+    write_manifest(manifest_path, version + 1, hashes)
+    print(f"Dictionary version {version + 1} written: {len(changed)} chunks "
+          f"and {counts['unique']} words reprocessed")
+    return version + 1
+
+
+def chunk_key(word):
+    """Returns the key of the source chunk holding a word"""
+    return word.lower()[:CHUNK_PREFIX_LENGTH]
+
+
+def hash_source_chunks(dictionary_path, frequency_dict):
+    """Returns a dictionary of hashes keyed by chunk, each covering the
+       source lines, and the frequencies, of the words in the chunk"""
+    line_hashes = {}
+    with open(dictionary_path, 'rb') as infile:
+        for line in infile:
+            word = line.split(b',', 1)[0].decode('utf-8', 'replace')
+            key = chunk_key(word)
+            if key not in line_hashes:
+                line_hashes[key] = hashlib.sha256()
+            line_hashes[key].update(line)
+
+    frequency_hashes = {}
+    for word, frequency in frequency_dict.items():
+        key = chunk_key(word)
+        if key not in frequency_hashes:
+            frequency_hashes[key] = hashlib.sha256()
+        frequency_hashes[key].update(f"{word} {frequency}\n".encode('utf-8'))
+
+    empty = hashlib.sha256().digest()
+    return {key: hashlib.sha256(
+                (line_hashes[key].digest() if key in line_hashes else empty) +
+                (frequency_hashes[key].digest() if key in frequency_hashes
+                 else empty)).hexdigest()
+            for key in line_hashes.keys() | frequency_hashes.keys()}
+
+
+def read_manifest(path):
+    """Reads the manifest of the last build, or returns None if there is
+       none"""
     try:
-        with open('../data/crossword_dictionary.json',
-                  'w', encoding='utf-8') as outfile:
-            outfile.write(json.dumps(word_dict, indent=4))
-    except FileExistsError:
-        print("Skipping file creation - 'data/crossword_dictionary.json'"
-              "already exists")
+        with open(path, 'r', encoding='utf-8') as infile:
+            return json.load(infile)
+    except FileNotFoundError:
+        return None
+
+
+def write_manifest(path, dictionary_version, hashes):
+    """Records the version and source chunk hashes of a build"""
+    manifest = {'dictionary_version': dictionary_version,
+                'chunks': dict(sorted(hashes.items()))}
+    _replace_file(path, lambda temporary_path: _write_json(manifest,
+                                                           temporary_path))
+
 
+def _write_json(value, path):
+    """Writes a value to a json file"""
+    with open(path, 'w', encoding='utf-8') as outfile:
+        json.dump(value, outfile, indent=4)
 
-def load_word_frequencies():
+
+def _replace_file(path, write):
+    """Calls write with a temporary path beside path, then moves the file
+       written into place, so that readers never see a partial file"""
+    temporary_path = f"{path}.tmp"
+    write(temporary_path)
+    os.replace(temporary_path, path)
+
+
+def load_word_frequencies(frequency_path=SOURCE_FREQUENCIES,
+                          filtered_frequency_path=FILTERED_FREQUENCIES):
     """Loads the wikipedia word frequency file and reads all the entries that
-       have a frequency of more than 500, then saves these entries to a new
-       file."""
+       have a frequency of at least MIN_FREQUENCY, then saves these entries to
+       a new file. The file is sorted by descending frequency, so reading
+       stops at the first less frequent word"""
     freq_dict = {}
-    with open('../data/enwiki-20210820-words-frequency.txt',
-              'r', encoding='utf-8') as infile:
+    with open(frequency_path, 'r', encoding='utf-8') as infile, \
+            open(filtered_frequency_path, 'w', encoding='utf-8') as outfile:
         for line in infile:
             elements = line.split(' ')
             frequency = int(elements[1].replace('\n', ''))
-            if frequency >= 100000:
-                freq_dict[elements[0]] = frequency
-            else:
+            if frequency < MIN_FREQUENCY:
                 break
+            freq_dict[elements[0]] = frequency
+            outfile.write(f"{elements[0]} {frequency}\n")
+    return freq_dict
 
-    try:
-        with open('../data/wiki-words-freq1000+.txt',
-                  'w', encoding='utf-8') as outfile:
-            for key, value in freq_dict.items():
-                outfile.writelines(f"{key} {value}\n")
-    except FileExistsError:
-        print("Skipping file creation - 'data/wiki-words-freq1000+.txt'"
-              " already exists")
 
-    return freq_dict
+def parse_large_dictionary(lines, counts):
+    """Parses lines of the source dictionary, yielding a (word, definition)
+       tuple, without the part-of-speech, for each line with a legal word and
+       a usable definition. The numbers of definitions rejected are added to
+       counts"""
+    for line in lines:
+        # Separate out all the comma separated values
+        split_line = line.split(',')
+
+        # If a line has less than three elements after splitting,
+        # reject it
+        if len(split_line) < 3:
+            continue
+        word = split_line[0]
+        if ' ' in word:
+            continue
+
+        # Reassemble all the values after the first 2, as many of
+        # the definitions themselves contain commas!
+        definition = ','.join(split_line[2:])
+        definition = definition.replace('"', '')
+        definition = definition.replace('\n', '')
+
+        # Exclude all definitions that start with 'of' - these simply refer
+        # to a base entry in the dictionary for a different part of speech
+        if definition.lower().startswith("of"):
+            counts['of'] += 1
+            continue
+
+        # Exclude all definitions that contain the word itself - These
+        # result in pretty easy clues!
+        if word.lower() in definition.lower():
+            counts['contains_word'] += 1
+            continue
+
+        # Ensure that the words contain the letters a-z only
+        if word.isalpha() and '-' not in word and "\'" not in word:
+            yield (word.lower(), definition)
+
+
+def shard_ranges(path, shards):
+    """Divides a file into byte ranges of roughly equal size, returned as a
+       list of (start, end) tuples"""
+    size = os.path.getsize(path)
+    bounds = [size * shard // shards for shard in range(shards + 1)]
+    return list(zip(bounds, bounds[1:]))
+
+
+def read_shard(path, start, end):
+    """Yields the lines of a file that begin within the byte range from
+       start to end. A line that starts before the range, and runs into it,
+       belongs to the previous shard"""
+    with open(path, 'rb') as infile:
+        if start > 0:
+            # Step back one byte, so that a line beginning exactly at start
+            # is not skipped as the end of the previous line
+            infile.seek(start - 1)
+            infile.readline()
+        while infile.tell() < end:
+            line = infile.readline()
+            if not line:
+                break
+            yield line.decode('utf-8').replace('\r\n', '\n')
+
 
+def ingest_shards(path, frequency_dict, counts, directory, chunk_size,
+                  workers=None):
+    """Filters the source dictionary shard by shard across a pool of worker
+       processes. Returns the paths of the sorted chunk files written, and
+       adds the rejections in every shard to counts"""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    ranges = shard_ranges(path, workers)
+    tasks = [(shard, path, start, end, directory, chunk_size)
+             for shard, (start, end) in enumerate(ranges)]
 
-def load_large_dictionary():
-    """Loads the source dictionary and removes illegal words. Saves the
-       dictionary to a new file without including the part-of-speech"""
-    word_list = []
-    of_count = 0
-    contains_word_count = 0
-    with open('../data/large_dictionary_2.txt', 'r', encoding='utf-8') as file:
-        for line in file:
-            # Separate out all the comma separated values
-            split_line = line.split(',')
-
-            # If a line has less than three elements after splitting,
-            # reject it
-            if len(split_line) < 3:
-                continue
-            word = split_line[0]
-            if ' ' in word:
-                continue
-
-            # Reassemble all the values after the first 2, as many of
-            # the definitions themselves contain commas!
-            definition = ','.join(split_line[2:])
-            definition = definition.replace('"', '')
-            definition = definition.replace('\n', '')
-
-            # Exclude all definitions that start with 'of' - these simply refer
-            # to a base entry in the dictionary for a different part of speech
-            if definition.lower().startswith("of"):
-                print(f"Invalid (starts with of) {definition}")
-                of_count += 1
-                continue
-
-            # Exclude all definitions that contain the word itself - These
-            # result in pretty easy clues!
-            if word.lower() in definition.lower():
-                print(f"Invalid (contains word itself) : ({word}) "
-                      f"{definition}")
-                contains_word_count += 1
-                continue
-
-            # Ensure that the words contain the letters a-z only
-            if word.isalpha() and '-' not in word and "\'" not in word:
-                word_list.append((word.lower(), definition))
-
-    word_list.sort()
-
-    # Write the sorted list of tuples to a new file. In order to avoid
-    # confusion, use the pipe '|' instead of the comma ',' as separator.
+    _shared['frequency_dict'] = frequency_dict
+    if workers == 1:
+        results = [_ingest_shard(*tasks[0])]
+    else:
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=context) as executor:
+            results = list(executor.map(_ingest_shard, *zip(*tasks)))
+
+    chunk_paths = []
+    for (shard_paths, shard_counts) in results:
+        chunk_paths.extend(shard_paths)
+        for key, value in shard_counts.items():
+            counts[key] += value
+    return chunk_paths
+
+
+def _ingest_shard(shard, path, start, end, directory, chunk_size):
+    """Parses, filters and joins one shard of the source dictionary in a
+       worker process, writing the records to sorted chunk files. Returns
+       the paths of the files and the counts of rejected definitions"""
+    counts = {'of': 0, 'contains_word': 0}
+    records = parse_large_dictionary(read_shard(path, start, end), counts)
+    records = join_frequencies(records, _shared['frequency_dict'])
+    chunk_paths = []
+    while True:
+        chunk = sorted(itertools.islice(records, chunk_size))
+        if not chunk:
+            break
+        chunk_path = os.path.join(directory,
+                                  f"shard-{shard}-{len(chunk_paths)}.jsonl")
+        with open(chunk_path, 'w', encoding='utf-8') as outfile:
+            for record in chunk:
+                outfile.write(json.dumps(record) + '\n')
+        chunk_paths.append(chunk_path)
+    return chunk_paths, counts
+
+
+def merge_chunks(chunk_paths):
+    """Yields the records from the sorted chunk files in sorted order"""
+    files = [open(path, 'r', encoding='utf-8') for path in chunk_paths]
     try:
-        with open('../data/large_dict_words_only.txt',
-                  'w', encoding='utf-8') as write_file:
-            for word in word_list:
-                write_file.writelines(f"{word[0]}|{word[1]}\n")
-    except FileExistsError:
-        print("Skipping file creation - 'data/large_dictionary.txt' already"
-              "exists")
+        yield from heapq.merge(*[_read_chunk(infile) for infile in files])
+    finally:
+        for infile in files:
+            infile.close()
+
+
+def _read_chunk(infile):
+    """Yields the records written to a chunk file by _ingest_shard"""
+    for line in infile:
+        yield tuple(json.loads(line))
+
+
+def write_sorted_words(records, path):
+    """Passes the records through unchanged, writing each to a file as it
+       goes. In order to avoid confusion, the pipe '|' is used instead of the
+       comma ',' as separator"""
+    with open(path, 'w', encoding='utf-8') as outfile:
+        for record in records:
+            outfile.write(f"{record[0]}|{record[1]}\n")
+            yield record
+
+
+def join_frequencies(records, frequency_dict):
+    """Yields a (word, definition, frequency) tuple for each (word,
+       definition) record. The frequency is None if the word is not in the
+       frequency dict. As a word has only one frequency, sorting these
+       tuples orders them by word and definition"""
+    for (word, definition) in records:
+        yield (word, definition, frequency_dict.get(word))
+
+
+def drop_unknown_words(records, counts):
+    """Passes on the records whose word has a frequency, counting those
+       that do not"""
+    for record in records:
+        if record[2] is None:
+            counts['not_in_frequency_dict'] += 1
+            continue
+        counts['total'] += 1
+        yield record
+
+
+def group_definitions(records, counts):
+    """Groups records sorted by word, yielding a (word, [frequency,
+       definitions]) tuple for each word"""
+    for word, group in itertools.groupby(records, key=lambda rec: rec[0]):
+        group = list(group)
+        counts['unique'] += 1
+        yield (word, [group[0][2], [record[1] for record in group]])
 
-    print(f"Of exclusions : {of_count}")
-    print(f"Contains word exclusions : {contains_word_count}")
 
-    return word_list
+def write_json_dictionary(entries, path):
+    """Writes (word, value) entries to a file as a json object, one entry at
+       a time. The file is identical to one written by json.dumps with an
+       indent of 4"""
+    with open(path, 'w', encoding='utf-8') as outfile:
+        separator = '{\n'
+        for word, value in entries:
+            value_json = json.dumps(value, indent=4).replace('\n', '\n    ')
+            outfile.write(f"{separator}    {json.dumps(word)}: {value_json}")
+            separator = ',\n'
+        outfile.write('{}' if separator == '{\n' else '\n}')
 
 
 if __name__ == '__main__':
-    main()
+    if len(sys.argv) > 1 and sys.argv[1] == 'compile':
+        compile_dictionary()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'update':
+        update_dictionary()
+    else:
+        main()
@@ -0,0 +1,150 @@
+"""
+A pool of pre-generated crosswords kept on disk, so that a session can begin
+a puzzle straight away rather than waiting for one to be generated.
+
+Each crossword is stored in its own small file, in the encoding of
+source/serialisation.py, which records the order its words were placed in
+so that its generation can be replayed. Crosswords encoded with a dictionary
+whose words differ are discarded when found, as are any that fail
+validation, such as one whose clues do not match the letters of its grid.
+A crossword is taken by renaming its file, which is atomic, so any number
+of sessions can share a pool without two of them taking the same crossword.
+The pool is topped up by a refill worker, running in the background while a
+session is played. Only one refill runs at a time, however many sessions
+start one: each takes a lock on the pool directory first, and leaves the
+refill to the worker holding it.
+"""
+import fcntl
+import multiprocessing
+import os
+import time
+import uuid
+
+from source.crossword_generator import Crossword
+from source.crossword_validator import validate
+from source.serialisation import decode_crossword, encode_crossword, WordIds
+
+POOL_DIRECTORY = 'data/puzzle_pool'
+POOL_SIZE = 8
+# The number of crosswords generate() tries before giving up. Nearly every
+# crossword passes validation, so reaching it means that no valid crossword
+# can be made with this grid size and dictionary.
+MAX_ATTEMPTS = 100
+PUZZLE_SUFFIX = '.puzzle'
+REFILL_LOCK = '.refill.lock'
+
+
+class PuzzlePool:
+    """A directory of ready crosswords of one size"""
+
+    def __init__(self, rows, cols, directory=POOL_DIRECTORY, size=POOL_SIZE):
+        self.rows = rows
+        self.cols = cols
+        self.directory = directory
+        self.size = size
+        self._word_ids = None
+        self._word_ids_source = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _get_word_ids(self, word_dict):
+        """Returns the word ids of a dictionary, reusing them while the same
+           dictionary is in use"""
+        if self._word_ids_source is not word_dict:
+            self._word_ids = WordIds(word_dict)
+            self._word_ids_source = word_dict
+        return self._word_ids
+
+    def _puzzle_names(self):
+        """Returns the names of the stored crosswords, oldest first"""
+        return sorted(name for name in os.listdir(self.directory)
+                      if name.endswith(PUZZLE_SUFFIX))
+
+    def __len__(self):
+        return len(self._puzzle_names())
+
+    def add(self, crossword):
+        """Stores a crossword in the pool. It is written to a temporary file
+           first, so it is never seen half written"""
+        name = f"{time.time_ns():020d}-{uuid.uuid4().hex}"
+        path = os.path.join(self.directory, name)
+        with open(path + '.tmp', 'wb') as outfile:
+            outfile.write(encode_crossword(
+                crossword, self._get_word_ids(crossword.word_dict)))
+        os.replace(path + '.tmp', path + PUZZLE_SUFFIX)
+
+    def pop(self, word_dict, word_length_map, word_index=None,
+            progress_callback=None):
+        """Takes the oldest crossword from the pool, decoding it with the
+           dictionary supplied, or returns None if the pool is empty. If a
+           progress_callback is supplied, the crossword is rebuilt word by
+           word with Crossword.from_placed_words, calling it for each"""
+        for name in self._puzzle_names():
+            path = os.path.join(self.directory, name)
+            taken_path = f"{path}.taken-{os.getpid()}"
+            try:
+                os.rename(path, taken_path)
+            except FileNotFoundError:
+                # Another session took this crossword first
+                continue
+            with open(taken_path, 'rb') as infile:
+                data = infile.read()
+            os.remove(taken_path)
+            try:
+                crossword = decode_crossword(data, word_dict,
+                                             word_length_map, word_index,
+                                             self._get_word_ids(word_dict))
+            except ValueError:
+                # Encoded with an older dictionary, or truncated or corrupt,
+                # so it cannot be used. decode_crossword raises ValueError
+                # for any data it cannot decode
+                continue
+            if not validate(crossword):
+                continue
+            if progress_callback is not None:
+                crossword = Crossword.from_placed_words(
+                    crossword.rows, crossword.cols, crossword.placed_words,
+                    word_length_map, word_dict, crossword.word_index,
+                    progress_callback)
+            return crossword
+        return None
+
+    def generate(self, word_dict, word_length_map, word_index=None,
+                 max_attempts=MAX_ATTEMPTS):
+        """Generates crosswords of the pool's size, discarding any that fail
+           validation, until a valid one is found. Raises RuntimeError if
+           none of max_attempts crosswords is valid"""
+        for _ in range(max_attempts):
+            crossword = Crossword(self.rows, self.cols, word_length_map,
+                                  word_dict, user_present=False,
+                                  word_index=word_index, headless=True)
+            if validate(crossword):
+                return crossword
+        raise RuntimeError(f"no valid {self.rows}x{self.cols} crossword "
+                           f"was generated in {max_attempts} attempts")
+
+    def refill(self, word_dict, word_length_map, word_index=None):
+        """Generates and validates crosswords, adding them to the pool,
+           until it holds its full size. Returns at once if another process
+           is already refilling the pool. Raises RuntimeError, leaving the
+           pool short, if generate gives up"""
+        lock_path = os.path.join(self.directory, REFILL_LOCK)
+        with open(lock_path, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            # The lock is released when the file is closed
+            while len(self) < self.size:
+                self.add(self.generate(word_dict, word_length_map,
+                                       word_index))
+
+    def start_refill(self, word_dict, word_length_map, word_index=None):
+        """Runs refill in a background process, which inherits the
+           dictionary, and returns the process"""
+        context = multiprocessing.get_context('fork')
+        process = context.Process(target=self.refill, daemon=True,
+                                  args=(word_dict, word_length_map,
+                                        word_index))
+        process.start()
+        return process
+
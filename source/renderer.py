@@ -0,0 +1,172 @@
+"""
+Draws frames to the terminal, writing only what has changed since the last
+frame.
+
+Each frame is drawn into a FrameBuffer as a set of cells, each being a short
+run of text at a screen position, with the escape codes for its colours. When
+the frame is rendered, it is compared with the frame last written to the
+terminal, and only the cells whose text or colours differ are written, in a
+single write. The game is played over a pty and a websocket, so this keeps
+the output for each keystroke to a few cells rather than the whole screen.
+
+The squares of a crossword are drawn from a cell cache, built once, holding
+the (style, text) of every combination of square colour, letter and
+highlight, so drawing a frame needs no string formatting.
+"""
+import string
+import sys
+import unicodedata
+
+from source.constants import AnsiCommands, get_large_letter
+from source.utilities import (get_move_cursor_string,
+                              get_alternating_square_color)
+
+
+class FrameBuffer:
+    """Holds the frame being drawn and the frame last written to the
+       terminal, as dicts of (style, text) keyed by the (col, row) of each
+       cell. A frame must be drawn in full before it is rendered, as any
+       cell of the last frame that is not drawn again is erased. Cells
+       within a frame must not overlap"""
+
+    def __init__(self, stream=None):
+        # If no stream is supplied, sys.stdout is looked up on each render
+        self.stream = stream
+        self._cells = {}
+        self._emitted = {}
+        self._clear = True
+        # The cursor movement to each position, and the width of each text,
+        # worked out when first needed
+        self._moves = {}
+        self._widths = {}
+
+    def draw(self, col, row, text, style=''):
+        """Draws a cell of the next frame. The style is the string of escape
+           codes that sets the colours of the text"""
+        self._cells[(col, row)] = (style, text)
+
+    def draw_cell(self, col, row, cell):
+        """Draws a (style, text) cell, such as one taken from a cell cache
+           (see build_cell_cache), into the next frame"""
+        self._cells[(col, row)] = cell
+
+    def invalidate(self):
+        """Forgets the frame last written, so the screen is cleared and
+           every cell written when the next frame is rendered. This must be
+           called when anything else clears or overwrites the screen"""
+        self._emitted = {}
+        self._clear = True
+
+    def render(self):
+        """Writes the changes between the frame drawn since the last render
+           and the frame on the screen, and returns the text written"""
+        output = []
+        if self._clear:
+            output.append(AnsiCommands.CLEAR_SCREEN)
+            output.append(AnsiCommands.CLEAR_BUFFER)
+            self._clear = False
+
+        cursor = None
+        style = ''
+        # Erase the cells that are no longer drawn. No cell of the new frame
+        # that is unchanged can overlap them, so this is done first
+        removed = self._emitted.keys() - self._cells.keys()
+        for (col, row) in sorted(removed, key=_row_major):
+            if cursor != (col, row):
+                output.append(self._move(col, row))
+            if style:
+                output.append(AnsiCommands.DEFAULT_COLOR)
+                style = ''
+            width = self._width(self._emitted[(col, row)][1])
+            output.append(' ' * width)
+            cursor = (col + width, row)
+
+        emitted = self._emitted
+        changed = [position for position, cell in self._cells.items()
+                   if emitted.get(position) is not cell and
+                   emitted.get(position) != cell]
+        for (col, row) in sorted(changed, key=_row_major):
+            cell = self._cells[(col, row)]
+            previous = emitted.get((col, row))
+            if cursor != (col, row):
+                output.append(self._move(col, row))
+            if cell[0] != style:
+                output.append(AnsiCommands.DEFAULT_COLOR)
+                output.append(cell[0])
+                style = cell[0]
+            output.append(cell[1])
+            width = self._width(cell[1])
+            cursor = (col + width, row)
+
+            # Blank whatever remains of a wider cell written here before
+            if previous is not None:
+                remainder = self._width(previous[1]) - width
+                if remainder > 0:
+                    if style:
+                        output.append(AnsiCommands.DEFAULT_COLOR)
+                        style = ''
+                    output.append(' ' * remainder)
+                    cursor = (col + width + remainder, row)
+
+        if style:
+            output.append(AnsiCommands.DEFAULT_COLOR)
+        self._emitted = self._cells
+        self._cells = {}
+
+        text = ''.join(output)
+        if text:
+            stream = self.stream if self.stream is not None else sys.stdout
+            stream.write(text)
+            stream.flush()
+        return text
+
+    def _move(self, col, row):
+        """Returns the escape code moving the cursor to a position"""
+        move = self._moves.get((col, row))
+        if move is None:
+            move = get_move_cursor_string(col, row)
+            self._moves[(col, row)] = move
+        return move
+
+    def _width(self, text):
+        """Returns the display width of a cell's text"""
+        width = self._widths.get(text)
+        if width is None:
+            width = display_width(text)
+            self._widths[text] = width
+        return width
+
+
+def build_cell_cache(blank_style, text_color, highlight_style=None):
+    """Returns the (style, text) of every square of a crossword, keyed by
+       (parity, letter, highlighted). The parity is (row + col) % 2, which
+       selects the colour of the alternating squares. The letter '_' gives a
+       blank square in the blank_style, and '*' a square with no letter
+       shown. Highlighted squares are only included if a highlight_style is
+       supplied. The same tuples are returned for every frame, so unchanged
+       cells are recognised without comparing their strings"""
+    cells = {}
+    letters = string.ascii_lowercase + '*'
+    highlights = [False] if highlight_style is None else [False, True]
+    for parity in (0, 1):
+        color = get_alternating_square_color(parity, 0)
+        for highlighted in highlights:
+            style = highlight_style if highlighted else color + text_color
+            cells[(parity, '_', highlighted)] = (blank_style, "  ")
+            for letter in letters:
+                text = "  " if letter == '*' else get_large_letter(letter)
+                cells[(parity, letter, highlighted)] = (style, text)
+    return cells
+
+
+def display_width(text):
+    """Returns the number of terminal columns taken by the text. Full width
+       characters, such as those from get_large_letter, take two"""
+    return sum(2 if unicodedata.east_asian_width(char) in 'FW' else 1
+               for char in text)
+
+
+def _row_major(position):
+    """Sort key placing the cells of a frame in the order they are read"""
+    (col, row) = position
+    return (row, col)
@@ -0,0 +1,229 @@
+"""
+A compact binary encoding of a Crossword, for storing puzzles and sessions
+and sending them between processes.
+
+An encoded crossword is a fixed header followed by:
+
+    grid            rows * cols bytes, the letters of the grid, row by row
+    user guesses    rows * cols bytes, only present if the user has guessed
+                    any letters (otherwise they are rebuilt from the grid)
+    clue table      one entry per clue, across clues first: the word's id in
+                    the dictionary, start row and column, clue index, the
+                    order in which the word was placed, the orientation and
+                    the definition being shown
+
+Words are stored by their id in the compiled dictionary, which is their
+position in alphabetical order. The checksum of the dictionary's word table
+is recorded, so a crossword is never decoded against a dictionary that
+numbers its words differently; the dictionary version is recorded for
+information only. Definitions are not stored; they are read from the
+dictionary when the crossword is decoded.
+The grid can be read without decoding the rest, or copying it, with
+read_grid.
+"""
+import struct
+
+from source.compiled_dictionary import (CompiledDictionary,
+                                        word_table_checksum)
+from source.constants import Orientation
+from source.crossword_generator import Crossword
+from source.grid import LetterGrid, BLANK, USE_ACROSS, USE_DOWN
+from source.utilities import Clue, Word
+
+MAGIC = b'XCWD'
+FORMAT_VERSION = 2
+
+# magic, format version, rows, cols, dictionary version, word table
+# checksum, across clue count, down clue count, selected clue, flags
+HEADER = struct.Struct('<4sHHHIIHHHB')
+# word id, start row, start column, index, placement order, orientation,
+# current definition
+CLUE = struct.Struct('<IHHHHBB')
+
+HAS_USER_GUESSES = 1
+NO_SELECTED_CLUE = 0xFFFF
+ORIENTATION_CODES = {Orientation.HORIZONTAL: 0, Orientation.VERTICAL: 1}
+ORIENTATIONS = [Orientation.HORIZONTAL, Orientation.VERTICAL]
+
+# The user guesses of a crossword the user has not yet touched: '*' in
+# every cell with a letter, and '_' elsewhere
+_UNTOUCHED_GUESSES = bytes(BLANK if byte == BLANK else ord('*')
+                           for byte in range(256))
+
+
+class WordIds:
+    """Numbers the words of a dictionary in alphabetical order, matching
+       the ids of the compiled dictionary. A CompiledDictionary is used
+       directly; any other dictionary is sorted once, so callers encoding
+       many crosswords should create one WordIds and share it"""
+
+    def __init__(self, word_dict):
+        if isinstance(word_dict, CompiledDictionary):
+            self.dictionary_version = word_dict.dictionary_version
+            self.checksum = word_dict.word_table_checksum
+            self.word_count = word_dict.word_count
+            self.word_id = word_dict.word_id
+            self.word_at = word_dict.word_at
+            self.definitions_at = word_dict.definitions_at
+        else:
+            self.dictionary_version = 0
+            words = sorted(word_dict)
+            self.checksum = word_table_checksum(words)
+            self.word_count = len(words)
+            ids = {word: word_id for word_id, word in enumerate(words)}
+            self.word_id = ids.get
+            self.word_at = words.__getitem__
+            self.definitions_at = \
+                lambda word_id: word_dict[words[word_id]][1]
+
+
+def encode_crossword(crossword, word_ids=None):
+    """Encodes a crossword as bytes"""
+    if word_ids is None:
+        word_ids = WordIds(crossword.word_dict)
+    clues = crossword.clues_across + crossword.clues_down
+
+    selected = NO_SELECTED_CLUE
+    for position, clue in enumerate(clues):
+        if clue is crossword.selected_clue:
+            selected = position
+
+    # Clues are matched to their words by orientation and start cell, which
+    # no two words share
+    placement = {(word.orientation, word.start_row, word.start_col): order
+                 for order, word in enumerate(crossword.placed_words)}
+
+    grid = crossword.grid.cells
+    guesses = crossword.user_guesses.cells
+    flags = 0
+    if guesses != grid.translate(_UNTOUCHED_GUESSES):
+        flags |= HAS_USER_GUESSES
+
+    parts = [HEADER.pack(MAGIC, FORMAT_VERSION, crossword.rows,
+                         crossword.cols, word_ids.dictionary_version,
+                         word_ids.checksum, len(crossword.clues_across),
+                         len(crossword.clues_down), selected, flags),
+             grid]
+    if flags & HAS_USER_GUESSES:
+        parts.append(guesses)
+    for clue in clues:
+        word_id = word_ids.word_id(clue.string)
+        if word_id is None:
+            raise ValueError(f"'{clue.string}' is not in the dictionary")
+        parts.append(CLUE.pack(
+            word_id, clue.start_row, clue.start_col, clue.index,
+            placement[(clue.orientation, clue.start_row, clue.start_col)],
+            ORIENTATION_CODES[clue.orientation], clue.current_definition))
+    return b''.join(parts)
+
+
+def _read_header(data):
+    """Unpacks and checks the header of an encoded crossword"""
+    if len(data) < HEADER.size:
+        raise ValueError("encoded crossword is too short")
+    (magic, format_version, rows, cols, dictionary_version, checksum,
+     across_count, down_count, selected, flags) = HEADER.unpack_from(data)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        raise ValueError(f"not an encoded crossword "
+                         f"(version {FORMAT_VERSION})")
+    return (rows, cols, dictionary_version, checksum, across_count,
+            down_count, selected, flags)
+
+
+def _check_length(data, rows, cols, clue_count, flags):
+    """Raises ValueError if the data is shorter than the grids and clue
+       table its header describes"""
+    size = rows * cols
+    if flags & HAS_USER_GUESSES:
+        size *= 2
+    if len(data) < HEADER.size + size + CLUE.size * clue_count:
+        raise ValueError("encoded crossword is truncated")
+
+
+def read_grid(data):
+    """Returns the letter grid of an encoded crossword as a view of the
+       encoded data, without copying it. The grid is writable only if the
+       data is"""
+    (rows, cols, _, _, across_count, down_count, _, flags) = \
+        _read_header(data)
+    _check_length(data, rows, cols, across_count + down_count, flags)
+    start = HEADER.size
+    return LetterGrid.from_buffer(rows, cols,
+                                  memoryview(data)[start:start + rows * cols])
+
+
+def decode_crossword(data, word_dict, word_length_map, word_index=None,
+                     word_ids=None):
+    """Decodes a crossword encoded by encode_crossword. Raises ValueError
+       if it was encoded with a dictionary whose word table differs, or if
+       the data is truncated or corrupt"""
+    if word_ids is None:
+        word_ids = WordIds(word_dict)
+    (rows, cols, dictionary_version, checksum, across_count, down_count,
+     selected, flags) = _read_header(data)
+    if checksum != word_ids.checksum:
+        raise ValueError(f"crossword was encoded with dictionary version "
+                         f"{dictionary_version}, whose words differ from "
+                         f"those of version {word_ids.dictionary_version}")
+    clue_count = across_count + down_count
+    _check_length(data, rows, cols, clue_count, flags)
+    if selected != NO_SELECTED_CLUE and selected >= clue_count:
+        raise ValueError(f"selected clue {selected} is out of range")
+
+    crossword = Crossword(rows, cols, word_length_map, word_dict,
+                          empty=True, word_index=word_index)
+    size = rows * cols
+    view = memoryview(data)
+    offset = HEADER.size
+    crossword.grid.cells[:] = view[offset:offset + size]
+    offset += size
+    if flags & HAS_USER_GUESSES:
+        crossword.user_guesses.cells[:] = view[offset:offset + size]
+        offset += size
+    else:
+        crossword.user_guesses.cells[:] = \
+            crossword.grid.cells.translate(_UNTOUCHED_GUESSES)
+
+    clues = []
+    placed = []
+    use_cells = crossword.letter_use.cells
+    for (word_id, start_row, start_col, index, order, orientation_code,
+         current_definition) in CLUE.iter_unpack(
+            view[offset:offset + CLUE.size * clue_count]):
+        if word_id >= word_ids.word_count or \
+                orientation_code >= len(ORIENTATIONS):
+            raise ValueError("encoded crossword has a corrupt clue table")
+        string = word_ids.word_at(word_id)
+        orientation = ORIENTATIONS[orientation_code]
+        (first, limit) = (start_col, cols) if orientation_code == 0 \
+            else (start_row, rows)
+        if start_row >= rows or start_col >= cols or \
+                first + len(string) > limit:
+            raise ValueError(f"'{string}' does not fit in the grid")
+        definitions = sorted(word_ids.definitions_at(word_id), key=len)
+        if current_definition >= len(definitions):
+            raise ValueError(f"'{string}' has no definition "
+                             f"{current_definition}")
+        clue = Clue(string, index, orientation, definitions,
+                    start_row, start_col)
+        clue.current_definition = current_definition
+        clues.append(clue)
+        placed.append((order, Word(orientation, string,
+                                   start_row, start_col)))
+
+        # Rebuild the record of which words use each cell
+        (step, use) = (1, USE_ACROSS) if orientation_code == 0 \
+            else (cols, USE_DOWN)
+        position = start_row * cols + start_col
+        for _ in string:
+            use_cells[position] |= use
+            position += step
+
+    crossword.clues_across = clues[:across_count]
+    crossword.clues_down = clues[across_count:]
+    crossword.placed_words = [word for _, word in sorted(
+        placed, key=lambda item: item[0])]
+    crossword.used_words = {word.string for word in crossword.placed_words}
+    if selected != NO_SELECTED_CLUE:
+        crossword.selected_clue = clues[selected]
+    return crossword
@@ -0,0 +1,58 @@
+class GenerationStats:
+    """Counters and timers recorded while a crossword is generated. They are
+       only collected when a Crossword is created with collect_stats=True;
+       otherwise the generator's only cost is a check that its stats
+       attribute is None"""
+
+    def __init__(self):
+        self.puzzles = 0
+        self.generation_seconds = 0.0
+        self.new_word_attempts = 0
+        self.new_word_successes = 0
+        self.trim_iterations = 0
+        self.find_matches_calls = 0
+        self.candidates_total = 0
+        self.candidates_max = 0
+        self.empty_match_calls = 0
+        self.prune_calls = 0
+        self.prune_seconds = 0.0
+        self.intersections_discarded = 0
+        self.intersections_pruned = 0
+
+    def record_matches(self, count):
+        """Records one call to find_matches and the number of matches"""
+        self.find_matches_calls += 1
+        self.candidates_total += count
+        if count > self.candidates_max:
+            self.candidates_max = count
+        if count == 0:
+            self.empty_match_calls += 1
+
+    def merge(self, other):
+        """Adds the counts from another GenerationStats into this one"""
+        for name, value in vars(other).items():
+            if name == 'candidates_max':
+                self.candidates_max = max(self.candidates_max, value)
+            else:
+                setattr(self, name, getattr(self, name) + value)
+        return self
+
+    @classmethod
+    def total(cls, stats_list):
+        """Returns the aggregate of several GenerationStats"""
+        aggregate = cls()
+        for stats in stats_list:
+            aggregate.merge(stats)
+        return aggregate
+
+    def as_dict(self):
+        """Returns the stats, and some ratios derived from them, as a
+           dictionary that can be serialised as json"""
+        result = dict(vars(self))
+        calls = self.find_matches_calls
+        attempts = self.new_word_attempts
+        result['candidates_mean'] = self.candidates_total / calls \
+            if calls else 0.0
+        result['new_word_success_rate'] = self.new_word_successes / attempts \
+            if attempts else 0.0
+        return result
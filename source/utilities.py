@@ -34,10 +34,76 @@ class Clue:
         return output
 
 
-def find_matches(candidate, word_length_map, word_dict):
+class IntersectionFrontier:
+    """The set of intersections from which new words may be grown. It
+       behaves like a set, but also supports removing a random member in
+       constant time: members are kept in a list, with a dictionary mapping
+       each member to its position in that list"""
+
+    def __init__(self, items=()):
+        self._items = []
+        self._positions = {}
+        for item in items:
+            self.add(item)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __contains__(self, item):
+        return item in self._positions
+
+    def __eq__(self, other):
+        if isinstance(other, IntersectionFrontier):
+            return self._positions.keys() == other._positions.keys()
+        if isinstance(other, (set, frozenset)):
+            return self._positions.keys() == other
+        return NotImplemented
+
+    def add(self, item):
+        """Adds an intersection, unless it is already present"""
+        if item not in self._positions:
+            self._positions[item] = len(self._items)
+            self._items.append(item)
+
+    def remove(self, item):
+        """Removes an intersection, raising KeyError if it is not present.
+           The last member of the list is moved into the vacated position"""
+        position = self._positions.pop(item)
+        last = self._items.pop()
+        if position < len(self._items):
+            self._items[position] = last
+            self._positions[last] = position
+
+    def discard(self, item):
+        """Removes an intersection if it is present"""
+        if item in self._positions:
+            self.remove(item)
+
+    def pop_random(self, rng):
+        """Removes and returns a randomly chosen intersection"""
+        item = self._items[rng.randrange(len(self._items))]
+        self.remove(item)
+        return item
+
+    def copy(self):
+        """Returns a shallow copy of the frontier"""
+        return IntersectionFrontier(self._items)
+
+
+def find_matches(candidate, word_length_map, word_dict,
+                 word_index=None, exclude=None):
     """Searches the word_dict to find matches for the supplied word.
-       Returns the list of matches sorted in descending order of
-       frequency"""
+       Returns the list of matches in the order of word_length_map, which
+       is built in descending order of frequency. If a WordIndex is
+       supplied, it is used to answer the search instead of scanning
+       word_length_map. Any words in the exclude set are left out of the
+       matches"""
+    if word_index is not None:
+        return word_index.find_matches(candidate, exclude)
+
     # Keep a list of tuples - the characters present in the candidate,
     # and their positional index within the word
     known_chars = []
@@ -58,13 +124,9 @@ def find_matches(candidate, word_length_map, word_dict):
             index, char = char_tuple
             if potential_match[index] != char:
                 match = False
-        if match:
+        if match and (exclude is None or potential_match not in exclude):
             matches.append(potential_match)
 
-    # Sort matches based on frequency (descending)
-    matches = sorted(matches,
-                     key=lambda mtch: word_dict[mtch][0], reverse=True)
-
     return matches
 
 
@@ -0,0 +1,156 @@
+from bisect import bisect_right
+from collections import OrderedDict
+from itertools import accumulate
+
+PATTERN_CACHE_SIZE = 4096
+
+# The number of weighted draws sample_match makes from a whole bucket before
+# falling back to listing the matches
+SAMPLE_ATTEMPTS = 32
+
+
+class WordIndex:
+    """A positional letter index over the word dictionary. For every word
+       length, the words are held in the order of word_length_map, which is
+       built in descending order of frequency, and for
+       every (length, position, letter) there is a bitmap recording which of
+       those words have that letter at that position. The bitmaps are stored
+       as python integers, so a partially filled candidate is matched by
+       AND-ing together the bitmaps for its known letters. The results of
+       recent searches are kept in a least-recently-used cache, keyed by
+       the pattern string"""
+
+    def __init__(self, word_length_map, word_dict,
+                 cache_size=PATTERN_CACHE_SIZE):
+        self.word_dict = word_dict
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache = OrderedDict()
+        # Words of each length, most frequent first
+        self._buckets = {}
+        # Running totals of the frequencies of the words in each bucket
+        self._cumulative = {}
+        # The position of each word within its bucket
+        self._ranks = {}
+        # Bitmaps keyed by (length, position, letter)
+        self._letter_bits = {}
+        # Bitmaps of all the words of each length
+        self._all_words = {}
+
+        for length, words in word_length_map.items():
+            bucket = list(words)
+            self._buckets[length] = bucket
+            self._cumulative[length] = \
+                list(accumulate(word_dict[word][0] for word in bucket))
+            self._all_words[length] = (1 << len(bucket)) - 1
+            for rank, word in enumerate(bucket):
+                self._ranks[word] = rank
+                bit = 1 << rank
+                for position, char in enumerate(word):
+                    key = (length, position, char)
+                    self._letter_bits[key] = \
+                        self._letter_bits.get(key, 0) | bit
+
+    def find_matches(self, candidate, exclude=None):
+        """Returns the words matching the candidate, a string or list of
+           characters with '_' marking unknown letters. The words are
+           returned in descending order of frequency. Words in the exclude
+           set, such as those already used by a crossword, are left out;
+           the cache holds the unfiltered results, so it can be shared by
+           crosswords excluding different words"""
+        pattern = ''.join(candidate)
+        matches = self._cache.get(pattern)
+        if matches is not None:
+            self._cache.move_to_end(pattern)
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+            matches = tuple(self._search(pattern))
+            if self.cache_size > 0:
+                self._cache[pattern] = matches
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        if exclude:
+            return [word for word in matches if word not in exclude]
+        return list(matches)
+
+    def sample_match(self, candidate, rng, exclude=None):
+        """Returns one word matching the candidate, chosen at random with
+           probability proportional to its frequency, or None if nothing
+           matches. Words are drawn from the whole bucket by their
+           frequency, and rejected until one matches, so the list of
+           matches is only built if many draws are rejected"""
+        pattern = ''.join(candidate)
+        bits = self._match_bits(pattern)
+        if not bits:
+            return None
+
+        length = len(pattern)
+        bucket = self._buckets[length]
+        cumulative = self._cumulative[length]
+        total = cumulative[-1]
+        if total > 0:
+            for _ in range(SAMPLE_ATTEMPTS):
+                rank = bisect_right(cumulative, rng.random() * total)
+                if bits >> rank & 1 and \
+                        (not exclude or bucket[rank] not in exclude):
+                    return bucket[rank]
+
+        matches = [word for word in self._words_from_bits(bucket, bits)
+                   if not exclude or word not in exclude]
+        if not matches:
+            return None
+        weights = [self.word_dict[word][0] for word in matches]
+        if sum(weights) == 0:
+            return rng.choice(matches)
+        return rng.choices(matches, weights)[0]
+
+    def _search(self, pattern):
+        """Finds the words matching a pattern string using the bitmaps"""
+        bits = self._match_bits(pattern)
+        if not bits:
+            return []
+        return self._words_from_bits(self._buckets[len(pattern)], bits)
+
+    def _match_bits(self, pattern):
+        """Returns the bitmap of the words matching a pattern"""
+        length = len(pattern)
+        if length not in self._buckets:
+            return 0
+
+        bits = self._all_words[length]
+        for position, char in enumerate(pattern):
+            if char != '_':
+                bits &= self._letter_bits.get((length, position, char), 0)
+                if not bits:
+                    return 0
+        return bits
+
+    def __contains__(self, word):
+        return word in self._ranks
+
+    def longest_word_length(self):
+        """Returns the length of the longest word in the index"""
+        lengths = [length for length, bits in self._all_words.items() if bits]
+        return max(lengths, default=0)
+
+    def cache_hit_ratio(self):
+        """Returns the proportion of searches answered from the cache"""
+        searches = self.cache_hits + self.cache_misses
+        return self.cache_hits / searches if searches else 0.0
+
+    @staticmethod
+    def _words_from_bits(bucket, bits):
+        """Converts a bitmap into the list of words it refers to. The bitmap
+           is rendered as a binary string once, rather than repeatedly
+           isolating its lowest bit, as each operation on a large integer
+           costs time proportional to its length"""
+        matches = []
+        digits = bin(bits)[:1:-1]
+        index = digits.find('1')
+        while index != -1:
+            matches.append(bucket[index])
+            index = digits.find('1', index + 1)
+        return matches
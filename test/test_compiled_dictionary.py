@@ -0,0 +1,75 @@
+from source.compiled_dictionary import (CompiledDictionary,
+                                        write_compiled_dictionary)
+from run import build_dictionary_and_length_map
+
+import json
+import pytest
+
+
+@pytest.fixture
+def compiled_dictionary(tmp_path):
+    """A small dictionary written to, and reopened from, a compiled file"""
+    word_dict = {"dog": [40, ["A canine.", "To follow closely."]],
+                 "cat": [10, ["A feline."]],
+                 "cot": [30, ["A small bed, with ünicode."]],
+                 "crate": [5, ["A box."]]}
+    path = tmp_path / "dictionary.bin"
+    write_compiled_dictionary(word_dict, path)
+    return word_dict, CompiledDictionary(path)
+
+
+def test_compiled_dictionary_returns_same_entries(compiled_dictionary):
+    """Tests that every word maps to the same frequency and definitions"""
+    (word_dict, compiled) = compiled_dictionary
+    assert (len(compiled) == len(word_dict))
+    for word, entry in word_dict.items():
+        assert (compiled[word] == entry)
+
+
+def test_compiled_dictionary_reports_missing_words(compiled_dictionary):
+    """Tests that words absent from the dictionary are not found"""
+    (_, compiled) = compiled_dictionary
+    assert ("cow" not in compiled and "a" not in compiled)
+    with pytest.raises(KeyError):
+        compiled["zebra"]
+
+
+def test_length_buckets_are_sorted_by_frequency(compiled_dictionary):
+    """Tests that the prebuilt length buckets list the most frequent first"""
+    (_, compiled) = compiled_dictionary
+    buckets = compiled.length_buckets()
+    assert (buckets == {3: ["dog", "cot", "cat"], 5: ["crate"]})
+
+
+def test_definitions_are_decoded_only_when_requested(compiled_dictionary,
+                                                     monkeypatch):
+    """Tests that reading a word's frequency does not decode its
+       definitions"""
+    (word_dict, compiled) = compiled_dictionary
+    decoded = []
+    definitions_at = compiled.definitions_at
+    monkeypatch.setattr(compiled, "definitions_at",
+                        lambda word_id: decoded.append(word_id) or
+                        definitions_at(word_id))
+    entry = compiled["dog"]
+    assert (entry[0] == 40 and decoded == [])
+    assert (entry[1] == word_dict["dog"][1] and len(decoded) == 1)
+
+
+def test_compiled_dictionary_is_not_used_once_json_is_edited(tmp_path):
+    """Tests that the compiled dictionary is loaded only while the json
+       dictionary it was compiled from is unchanged"""
+    json_path = tmp_path / "dictionary.json"
+    compiled_path = tmp_path / "dictionary.bin"
+    word_dict = {"cat": [10, ["A feline."]]}
+    json_path.write_text(json.dumps(word_dict), encoding='utf-8')
+    write_compiled_dictionary(word_dict, compiled_path, source_path=json_path)
+    (loaded, _) = build_dictionary_and_length_map(json_path, compiled_path)
+    assert (isinstance(loaded, CompiledDictionary))
+
+    word_dict["dog"] = [20, ["A canine."]]
+    json_path.write_text(json.dumps(word_dict), encoding='utf-8')
+    (loaded, word_length_map) = build_dictionary_and_length_map(
+        json_path, compiled_path)
+    assert (not isinstance(loaded, CompiledDictionary))
+    assert (word_length_map[3] == ["dog", "cat"])
@@ -1,9 +1,14 @@
 from source.crossword_generator import Crossword
+from source.renderer import FrameBuffer
 from run import build_dictionary_and_length_map
+from source.batch import generate_batch
+from source.crossword_validator import validate
+from source.fill_engine import BacktrackingFiller
 
+import itertools
 import pytest
 from source.constants import LetterUse, Orientation
-from source.utilities import Clue
+from source.utilities import Clue, Word
 
 
 @pytest.fixture
@@ -194,6 +199,27 @@ def test_reindex_clues_gives_same_index_to_clues_starting_in_same_cell(puzzle_w_
     assert (index_shared is True)
 
 
+def test_reindex_clues_does_not_reuse_down_index_in_shared_cell(blank_puzzle):
+    """Places two down clues, which take down indices 1 and 2, to the left of
+       an across and down clue sharing a start cell. The shared index must
+       skip 2, which is already used by a down clue"""
+    blank_puzzle.clues_across = [
+        Clue("x", 0, Orientation.HORIZONTAL, [], 6, 0),
+        Clue("x", 0, Orientation.HORIZONTAL, [], 4, 3)]
+    blank_puzzle.clues_down = [
+        Clue("x", 0, Orientation.VERTICAL, [], 0, 0),
+        Clue("x", 0, Orientation.VERTICAL, [], 0, 1),
+        Clue("x", 0, Orientation.VERTICAL, [], 4, 3)]
+    blank_puzzle.reindex_clues()
+    down_indices = [clue.index for clue in blank_puzzle.clues_down]
+    assert (len(set(down_indices)) == len(down_indices))
+    (shared_across,) = [clue for clue in blank_puzzle.clues_across
+                        if clue.start_col == 3]
+    (shared_down,) = [clue for clue in blank_puzzle.clues_down
+                      if clue.start_col == 3]
+    assert (shared_across.index == shared_down.index == 3)
+
+
 def test_reindex_clues_gives_consecutive_indices_to_clues(puzzle_w_clues):
     """Calls function, and then checks to ensure that the clues of each orientation
        respectively are indexed from zero without missing any numbers"""
@@ -213,3 +239,205 @@ def test_reindex_clues_gives_consecutive_indices_to_clues(puzzle_w_clues):
 
     # assert that the sets are equal(contain same elements)
     assert (across_indices_set == result_across_set and down_indices_set == result_down_set)
+
+
+def test_headless_generation_writes_nothing_to_stdout(capsys):
+    """Generates a crossword in headless mode, and checks that nothing is
+       written to the terminal while the progress callback sees every word"""
+    (word_dict, word_length_map) = build_dictionary_and_length_map()
+    placed_words = []
+    crossword = Crossword(9, 9, word_length_map, word_dict,
+                          user_present=False, headless=True,
+                          progress_callback=lambda cw, word:
+                          placed_words.append(word.string))
+    clue_count = len(crossword.clues_across) + len(crossword.clues_down)
+    assert (capsys.readouterr().out == "")
+    # The first word is placed before the callback is in use
+    assert (len(placed_words) == clue_count - 1)
+
+
+def test_generate_batch_reproduces_crosswords_from_seed():
+    """Generates the same small batch twice from one seed, and checks that
+       every crossword is valid and identical in both batches"""
+    (word_dict, word_length_map) = build_dictionary_and_length_map()
+    first = generate_batch(4, 9, 9, word_dict, word_length_map, seed=7,
+                           workers=2)
+    second = generate_batch(4, 9, 9, word_dict, word_length_map, seed=7,
+                            workers=2)
+    first_results = list(first)
+    first_grids = {result.number: result.crossword.grid
+                   for result in first_results}
+    second_grids = {result.number: result.crossword.grid
+                    for result in second}
+    assert (all(result.valid for result in first_results))
+    assert (len(first_grids) == 4 and first_grids == second_grids)
+
+
+def test_crosswords_with_same_seed_are_identical():
+    """Generates two crosswords from the same seed, with another generated
+       in between, and checks that their grids and clues are the same"""
+    (word_dict, word_length_map) = build_dictionary_and_length_map()
+    first = Crossword(11, 11, word_length_map, word_dict, user_present=False,
+                      headless=True, seed=1234)
+    Crossword(11, 11, word_length_map, word_dict, user_present=False,
+              headless=True, seed=99)
+    second = Crossword(11, 11, word_length_map, word_dict,
+                       user_present=False, headless=True, seed=1234)
+    first_clues = [clue.string for clue in first.clues_across]
+    second_clues = [clue.string for clue in second.clues_across]
+    assert (first.grid == second.grid and first_clues == second_clues)
+
+
+def test_prune_intersections_around_removes_only_neighbouring_cells(blank_puzzle):
+    """Adds an intersection beside a new word and another far from it, and
+       checks that only the one beside the word is removed"""
+    blank_puzzle.intersections.add((1, 3, Orientation.VERTICAL))
+    blank_puzzle.intersections.add((5, 5, Orientation.VERTICAL))
+    word = Word(Orientation.HORIZONTAL, "cat", 2, 2)
+    blank_puzzle.grid[2][2:5] = ["c", "a", "t"]
+    blank_puzzle.prune_intersections_around(word)
+    assert (set(blank_puzzle.intersections) == {(5, 5, Orientation.VERTICAL)})
+
+
+def test_incremental_prune_leaves_same_frontier_as_full_rescan():
+    """Generates crosswords and, after each word is placed and the
+       intersections around it pruned, checks that a full rescan of the
+       intersections finds nothing more to remove"""
+    (word_dict, word_length_map) = build_dictionary_and_length_map()
+
+    def check_frontier(crossword, word):
+        frontier = set(crossword.intersections)
+        crossword.prune_intersection_set()
+        assert (set(crossword.intersections) == frontier)
+
+    for seed in range(5):
+        Crossword(11, 11, word_length_map, word_dict, user_present=False,
+                  headless=True, seed=seed, progress_callback=check_frontier)
+
+
+def test_backtracking_filler_with_no_backtracks_keeps_its_grid(blank_puzzle):
+    """Runs the backtracking search with no backtracks allowed and an
+       unreachable fill ratio, and checks that it keeps the grid of its one
+       attempt rather than failing to restore a snapshot"""
+    filler = BacktrackingFiller(blank_puzzle, min_fill_ratio=1.0,
+                                max_backtracks=0)
+    assert (filler.fill() is False)
+    assert (blank_puzzle.placed_words and
+            blank_puzzle.fill_ratio() == filler.best_fill_ratio)
+
+
+def test_backtracking_engine_reaches_minimum_fill_ratio():
+    """Generates crosswords with the backtracking engine, and checks that
+       each one is valid and at least as full as requested"""
+    (word_dict, word_length_map) = build_dictionary_and_length_map()
+    for seed in range(5):
+        crossword = Crossword(11, 11, word_length_map, word_dict,
+                              user_present=False, headless=True, seed=seed,
+                              engine="backtracking", min_fill_ratio=0.5)
+        assert (crossword.fill_ratio() >= 0.5)
+        assert (validate(crossword) is True)
+
+
+def test_backtracking_progress_is_replayed_word_by_word():
+    """Tests that the progress callback of the backtracking engine sees the
+       grid fill up one kept word at a time, ending with the finished
+       grid"""
+    (word_dict, word_length_map) = build_dictionary_and_length_map()
+    filled = []
+    crossword = Crossword(11, 11, word_length_map, word_dict,
+                          user_present=False, headless=True, seed=1,
+                          engine="backtracking", progress_callback=lambda
+                          puzzle, word: filled.append(puzzle.fill_ratio()))
+    assert (len(filled) == len(crossword.placed_words) - 1)
+    assert (filled == sorted(set(filled)))
+    assert (filled[-1] == crossword.fill_ratio())
+
+
+def test_generation_stats_are_collected_only_on_request():
+    """Checks that stats are absent by default, and that when collected,
+       every successful word attempt corresponds to a placed word"""
+    (word_dict, word_length_map) = build_dictionary_and_length_map()
+    plain = Crossword(11, 11, word_length_map, word_dict, user_present=False,
+                      headless=True, seed=3)
+    counted = Crossword(11, 11, word_length_map, word_dict,
+                        user_present=False, headless=True, seed=3,
+                        collect_stats=True)
+    stats = counted.stats
+    assert (plain.stats is None and stats.puzzles == 1)
+    assert (stats.new_word_successes == len(counted.placed_words) - 1)
+    assert (stats.new_word_attempts == stats.new_word_successes +
+            stats.intersections_discarded)
+
+
+def test_generation_leaves_shared_dictionary_unchanged(monkeypatch):
+    """Generates crosswords with a user present, which previously removed
+       their words from the dictionary, and checks that the shared map is
+       unchanged and that no word is used twice in one crossword"""
+    (word_dict, word_length_map) = build_dictionary_and_length_map()
+    original = {length: list(words)
+                for length, words in word_length_map.items()}
+    monkeypatch.setattr("builtins.input", lambda prompt: "")
+    for seed in range(3):
+        crossword = Crossword(11, 11, word_length_map, word_dict,
+                              user_present=True, seed=seed,
+                              progress_callback=lambda puzzle, word: None)
+        words = [word.string for word in crossword.placed_words]
+        assert (len(words) == len(set(words)) == len(crossword.used_words))
+    assert (dict(word_length_map) == original)
+
+
+def test_weighted_generation_produces_valid_crosswords():
+    """Generates crosswords choosing words by frequency, and checks that
+       they are valid"""
+    (word_dict, word_length_map) = build_dictionary_and_length_map()
+    for seed in range(5):
+        crossword = Crossword(11, 11, word_length_map, word_dict,
+                              user_present=False, headless=True, seed=seed,
+                              weighted=True)
+        assert (len(crossword.placed_words) > 1)
+        assert (validate(crossword) is True)
+
+
+def test_generate_batch_can_return_results_without_crosswords():
+    """Generates a batch without keeping the crosswords, and checks that
+       each result still reports its validity and violations"""
+    (word_dict, word_length_map) = build_dictionary_and_length_map()
+    results = list(generate_batch(3, 9, 9, word_dict, word_length_map,
+                                  seed=11, workers=2, keep_crosswords=False))
+    assert (sorted(result.number for result in results) == [0, 1, 2])
+    assert (all(result.crossword is None and result.valid and
+                isinstance(result.violations, list) for result in results))
+
+
+@pytest.mark.parametrize("frame_interval", [0, 1000])
+def test_animation_drops_frames_within_frame_interval(monkeypatch, capsys,
+                                                       frame_interval):
+    """Generates an animated crossword on a clock that ticks once per
+       reading, and checks that frames are dropped within the frame
+       interval, that all output is written by the frames, and that the
+       finished crossword is always shown"""
+    clock = itertools.count()
+    monkeypatch.setattr("source.crossword_generator.perf_counter",
+                        lambda: next(clock))
+    monkeypatch.setattr("source.crossword_generator.FRAME_INTERVAL",
+                        frame_interval)
+    renders = []
+    render = FrameBuffer.render
+    monkeypatch.setattr(FrameBuffer, "render",
+                        lambda frame_buffer:
+                        renders.append(render(frame_buffer)))
+    (word_dict, word_length_map) = build_dictionary_and_length_map()
+    crossword = Crossword(9, 9, word_length_map, word_dict,
+                          user_present=False, seed=3)
+    if frame_interval == 0:
+        # The first word is placed before the animation starts
+        assert (len(renders) == len(crossword.placed_words) - 1)
+    else:
+        # Only the first frame and the finished crossword are drawn
+        assert (len(renders) == 2)
+    assert (capsys.readouterr().out.startswith(''.join(renders)))
+
+    crossword.draw_grid(show_letters=True)
+    crossword.draw_welcome_message()
+    crossword.frame_buffer.render()
+    assert (renders[-1] == "")
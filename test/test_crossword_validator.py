@@ -0,0 +1,105 @@
+from source.crossword_generator import Crossword
+from source import crossword_validator
+from source.crossword_validator import (check_crossword, validate,
+                                        ValidationSummary, ADJACENT_CLUE,
+                                        CLUE_MISMATCH, DUPLICATE_INDEX,
+                                        GRID_2X2, UNKNOWN_WORD)
+from run import build_dictionary_and_length_map
+
+import pytest
+from source.constants import Orientation
+from source.utilities import Clue
+
+
+@pytest.fixture
+def blank_puzzle():
+    """A crossword containing only empty cells"""
+    (word_dict, word_length_map) = build_dictionary_and_length_map()
+    return Crossword(7, 7, word_length_map, word_dict, empty=True)
+
+
+@pytest.fixture(params=["bitmask", "numpy"])
+def grid_method(request, monkeypatch):
+    """Runs a test with each way of finding 2x2 groups"""
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+        monkeypatch.setattr(crossword_validator, "NUMPY_MIN_CELLS", 0)
+    else:
+        monkeypatch.setattr(crossword_validator, "numpy", None)
+    return request.param
+
+
+def test_valid_crosswords_have_no_violations():
+    """Tests that generated crosswords pass every rule"""
+    (word_dict, word_length_map) = build_dictionary_and_length_map()
+    for seed in range(5):
+        crossword = Crossword(11, 11, word_length_map, word_dict,
+                              user_present=False, headless=True, seed=seed)
+        report = check_crossword(crossword)
+        assert (report.valid and validate(crossword) is True)
+
+
+def test_every_2x2_group_is_reported(blank_puzzle, grid_method):
+    """Fills a 2x3 block of cells, and checks that both 2x2 groups in it
+       are found"""
+    blank_puzzle.grid[2][3:6] = ["a", "b", "c"]
+    blank_puzzle.grid[3][3:6] = ["d", "e", "f"]
+    report = check_crossword(blank_puzzle)
+    assert ([(violation.rule, violation.row, violation.col)
+             for violation in report.violations] ==
+            [(GRID_2X2, 2, 3), (GRID_2X2, 2, 4)])
+    assert (report.valid is False)
+
+
+def test_clue_violations_are_all_reported(blank_puzzle):
+    """Places clues breaking each clue rule, and checks that every
+       violation is reported in a single report"""
+    blank_puzzle.grid[0][0:3] = ["c", "a", "r"]
+    blank_puzzle.grid[0][3] = "s"
+    blank_puzzle.grid[2][0:3] = ["z", "q", "x"]
+    blank_puzzle.grid[4][1:4] = ["b", "o", "a"]
+    blank_puzzle.clues_across = [
+        Clue("car", 1, Orientation.HORIZONTAL, [], 0, 0),
+        Clue("zqx", 2, Orientation.HORIZONTAL, [], 2, 0),
+        Clue("box", 3, Orientation.HORIZONTAL, [], 4, 1)]
+    blank_puzzle.clues_down = [
+        Clue("age", 2, Orientation.VERTICAL, [], 4, 5),
+        Clue("age", 2, Orientation.VERTICAL, [], 4, 6)]
+    counts = check_crossword(blank_puzzle).counts()
+    assert (counts == {GRID_2X2: 0, CLUE_MISMATCH: 3, ADJACENT_CLUE: 1,
+                       UNKNOWN_WORD: 1, DUPLICATE_INDEX: 1})
+
+
+def test_duplicate_indices_make_crossword_invalid(blank_puzzle):
+    """Tests that two clues of one orientation sharing an index make a
+       crossword invalid, as the user cannot tell which one they mean"""
+    blank_puzzle.grid[0][0:3] = ["c", "a", "r"]
+    blank_puzzle.grid[4][0:3] = ["b", "o", "x"]
+    blank_puzzle.clues_across = [
+        Clue("car", 1, Orientation.HORIZONTAL, [], 0, 0),
+        Clue("box", 1, Orientation.HORIZONTAL, [], 4, 0)]
+    report = check_crossword(blank_puzzle)
+    assert (len(report.violations) == 1 and not report.valid)
+
+
+def test_summary_tables_violations_and_failure_rates(blank_puzzle,
+                                                      tmp_path):
+    """Adds the reports of an invalid and a valid crossword to a summary,
+       and checks the table of violations and the failure rates"""
+    blank_puzzle.grid[0][0:3] = ["c", "a", "r"]
+    blank_puzzle.clues_across = [
+        Clue("car", 1, Orientation.HORIZONTAL, [], 0, 0),
+        Clue("zqx", 2, Orientation.HORIZONTAL, [], 2, 0)]
+    report = check_crossword(blank_puzzle)
+    summary = ValidationSummary()
+    summary.add(0, 100, report.valid, report.violations)
+    summary.add(1, 101, True, [])
+    assert (summary.table == [(0, 100, CLUE_MISMATCH, 2, 0, "zqx"),
+                              (0, 100, UNKNOWN_WORD, 2, 0, "zqx")])
+    assert (summary.failure_rate() == 0.5)
+    assert (summary.failure_rate(UNKNOWN_WORD) == 0.5)
+    assert (summary.failure_rate(GRID_2X2) == 0.0)
+    path = tmp_path / "violations.csv"
+    summary.write_table(path)
+    assert (path.read_text(encoding='utf-8').splitlines()[1] ==
+            "0,100,clue does not match grid,2,0,zqx")
@@ -0,0 +1,113 @@
+from source.compiled_dictionary import CompiledDictionary
+from source.main import (compile_dictionary, main, read_shard, shard_ranges,
+                         update_dictionary, write_json_dictionary)
+
+import json
+import pytest
+
+SOURCE_LINES = ['crate,n.,A box, often wooden.\n',
+                'dog,v.,To follow closely.\n',
+                'cat,n.,A feline.\n',
+                'dog,n.,A canine.\n',
+                'dog,n.,A dog show.\n',
+                'cot,n.,Of a bed.\n',
+                'cot,n.,A small bed.\n',
+                'ice cream,n.,A frozen dessert.\n',
+                'zebra,n.,A striped horse.\n',
+                "can't,v.,Cannot.\n",
+                'short line\n']
+FREQUENCY_LINES = ['dog 400000\n', 'crate 300000\n', 'cot 200000\n',
+                   'cat 100000\n', 'zebra 99999\n']
+
+
+@pytest.fixture
+def source_files(tmp_path):
+    """A small source dictionary and frequency list written to files"""
+    dictionary_path = tmp_path / "dictionary.txt"
+    dictionary_path.write_text(''.join(SOURCE_LINES), encoding='utf-8')
+    frequency_path = tmp_path / "frequencies.txt"
+    frequency_path.write_text(''.join(FREQUENCY_LINES), encoding='utf-8')
+    return tmp_path, dictionary_path, frequency_path
+
+
+@pytest.mark.parametrize("chunk_size, workers",
+                         [(1000, 1), (2, 1), (2, 3), (1000, 4)])
+def test_build_writes_same_json_as_in_memory_build(source_files, chunk_size,
+                                                   workers):
+    """Builds the dictionary with the sort done in one chunk and merged
+       from several, in one shard and split across several workers, and
+       checks that every build gives the file json.dumps would"""
+    (directory, dictionary_path, frequency_path) = source_files
+    output_path = directory / "crossword_dictionary.json"
+    main(dictionary_path, frequency_path, output_path,
+         directory / "sorted.txt", directory / "filtered.txt", chunk_size,
+         workers)
+    expected = {"cat": [100000, ["A feline."]],
+                "cot": [200000, ["A small bed."]],
+                "crate": [300000, ["A box, often wooden."]],
+                "dog": [400000, ["A canine.", "To follow closely."]]}
+    assert (output_path.read_text(encoding='utf-8') ==
+            json.dumps(expected, indent=4))
+
+
+def test_empty_dictionary_is_written_as_empty_json_object(tmp_path):
+    """Tests that writing no entries gives a valid json file"""
+    path = tmp_path / "empty.json"
+    write_json_dictionary(iter([]), path)
+    assert (json.loads(path.read_text(encoding='utf-8')) == {})
+
+
+def test_shards_cover_every_line_exactly_once(source_files):
+    """Splits the source file into more shards than it has lines, and
+       checks that reading them in turn gives back every line in order"""
+    (_, dictionary_path, _) = source_files
+    lines = []
+    for (start, end) in shard_ranges(dictionary_path, 40):
+        lines.extend(read_shard(dictionary_path, start, end))
+    assert (lines == SOURCE_LINES)
+
+
+def test_update_reprocesses_changed_chunks_like_a_full_build(source_files):
+    """Builds a dictionary, fixes a clue and a frequency in the sources,
+       and checks that an update gives the same json as a full build of the
+       new sources, in a new version of the compiled dictionary"""
+    (directory, dictionary_path, frequency_path) = source_files
+
+    def update():
+        return update_dictionary(dictionary_path, frequency_path,
+                                 directory / "dictionary.json",
+                                 directory / "dictionary.bin",
+                                 directory / "manifest.json",
+                                 directory / "sorted.txt",
+                                 directory / "filtered.txt", workers=1)
+
+    assert (update() == 1 and update() == 1)
+    dictionary_path.write_text(
+        ''.join(SOURCE_LINES).replace("A feline.", "A small feline."),
+        encoding='utf-8')
+    frequency_path.write_text(
+        ''.join(FREQUENCY_LINES).replace("dog 400000", "dog 500000"),
+        encoding='utf-8')
+    assert (update() == 2)
+
+    main(dictionary_path, frequency_path, directory / "full.json",
+         directory / "sorted.txt", directory / "filtered.txt", workers=1)
+    assert ((directory / "dictionary.json").read_text(encoding='utf-8') ==
+            (directory / "full.json").read_text(encoding='utf-8'))
+    compiled = CompiledDictionary(directory / "dictionary.bin")
+    assert (compiled.dictionary_version == 2)
+    assert (compiled["cat"] == [100000, ["A small feline."]])
+    assert (compiled["dog"][0] == 500000)
+
+
+def test_recompiling_increases_dictionary_version(tmp_path):
+    """Tests that each compile of the json dictionary increases the version
+       of the compiled dictionary it replaces"""
+    json_path = tmp_path / "dictionary.json"
+    json_path.write_text(json.dumps({"cat": [10, ["A feline."]]}),
+                         encoding='utf-8')
+    compiled_path = tmp_path / "dictionary.bin"
+    compile_dictionary(json_path, compiled_path)
+    assert (CompiledDictionary(compiled_path).dictionary_version == 1)
+    compile_dictionary(json_path, compiled_path)
+    assert (CompiledDictionary(compiled_path).dictionary_version == 2)
@@ -0,0 +1,27 @@
+from source.grid import LetterGrid, UseGrid
+from source.constants import LetterUse
+
+
+def test_letter_grid_reads_and_writes_by_row_and_column():
+    """Tests that a cell written with grid[row][col] is read back from the
+       same cell of the packed buffer, and no other"""
+    grid = LetterGrid(3, 4)
+    grid[1][2] = "x"
+    assert (grid[1][2] == "x" and grid.get(1, 2) == "x")
+    assert (grid.cells.count(ord("_")) == 11)
+    assert (grid.to_lists()[1] == ["_", "_", "x", "_"])
+
+
+def test_use_grid_stores_letter_use_values():
+    """Tests that LetterUse values survive being packed into a bitfield"""
+    grid = UseGrid(2, 2)
+    grid[0][1] = LetterUse.BOTH
+    assert (grid[0][1] is LetterUse.BOTH and grid[1][1] is LetterUse.NONE)
+
+
+def test_copied_grid_is_independent():
+    """Tests that a copy of a grid does not share its buffer"""
+    grid = LetterGrid(2, 2)
+    clone = grid.copy()
+    clone[0][0] = "a"
+    assert (grid[0][0] == "_" and clone == [["a", "_"], ["_", "_"]])
@@ -0,0 +1,120 @@
+from source.crossword_generator import Crossword
+from source import puzzle_pool
+from source.puzzle_pool import PuzzlePool, REFILL_LOCK
+from run import build_dictionary_and_length_map
+
+import fcntl
+import pytest
+
+
+@pytest.fixture
+def dictionary():
+    """The word dictionary and word length map"""
+    return build_dictionary_and_length_map()
+
+
+def test_pool_returns_crossword_as_it_was_added(tmp_path, dictionary):
+    """Adds a crossword to a pool, takes it back, and checks that the grid,
+       clues and placement order are unchanged"""
+    (word_dict, word_length_map) = dictionary
+    pool = PuzzlePool(9, 9, directory=tmp_path)
+    original = Crossword(9, 9, word_length_map, word_dict,
+                         user_present=False, headless=True, seed=5)
+    pool.add(original)
+    assert (len(pool) == 1)
+
+    replayed = []
+    crossword = pool.pop(word_dict, word_length_map,
+                         progress_callback=lambda puzzle, word:
+                         replayed.append(word.string))
+    assert (crossword.grid == original.grid)
+    assert ([(clue.index, clue.string, clue.definitions)
+             for clue in crossword.clues_across + crossword.clues_down] ==
+            [(clue.index, clue.string, clue.definitions)
+             for clue in original.clues_across + original.clues_down])
+    assert (replayed == [word.string for word in original.placed_words[1:]])
+    assert (len(pool) == 0 and pool.pop(word_dict, word_length_map) is None)
+
+
+def test_refill_tops_pool_up_to_its_size(tmp_path, dictionary):
+    """Tests that refilling an empty pool adds crosswords until it is
+       full"""
+    (word_dict, word_length_map) = dictionary
+    pool = PuzzlePool(9, 9, directory=tmp_path, size=3)
+    pool.refill(word_dict, word_length_map)
+    assert (len(pool) == 3)
+
+
+def test_concurrent_refills_do_not_overfill_pool(tmp_path, dictionary):
+    """Starts several refills at once, and checks that the pool holds
+       exactly its size once they have finished, and that a refill started
+       while another holds the lock adds nothing"""
+    (word_dict, word_length_map) = dictionary
+    pool = PuzzlePool(9, 9, directory=tmp_path, size=4)
+    processes = [pool.start_refill(word_dict, word_length_map)
+                 for _ in range(4)]
+    for process in processes:
+        process.join()
+    assert (len(pool) == 4)
+
+    pool.pop(word_dict, word_length_map)
+    with open(tmp_path / REFILL_LOCK, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        pool.refill(word_dict, word_length_map)
+        assert (len(pool) == 3)
+    pool.refill(word_dict, word_length_map)
+    assert (len(pool) == 4)
+
+
+def test_unreadable_crosswords_are_discarded(tmp_path, dictionary):
+    """Tests that a stored crossword that cannot be decoded, such as one
+       encoded with another dictionary version, is skipped and removed"""
+    (word_dict, word_length_map) = dictionary
+    pool = PuzzlePool(9, 9, directory=tmp_path)
+    (tmp_path / "0-stale.puzzle").write_bytes(b"XCWD" + bytes(20))
+    assert (pool.pop(word_dict, word_length_map) is None and len(pool) == 0)
+
+
+def test_truncated_crosswords_are_skipped(tmp_path, dictionary):
+    """Tests that stored crosswords cut short at any point are discarded,
+       and the next crossword in the pool is returned"""
+    (word_dict, word_length_map) = dictionary
+    pool = PuzzlePool(9, 9, directory=tmp_path)
+    crossword = Crossword(9, 9, word_length_map, word_dict,
+                          user_present=False, headless=True, seed=5)
+    pool.add(crossword)
+    (name,) = pool._puzzle_names()
+    data = (tmp_path / name).read_bytes()
+    for length in range(0, len(data), 7):
+        (tmp_path / f"0-{length:04d}.puzzle").write_bytes(data[:length])
+    taken = pool.pop(word_dict, word_length_map)
+    assert (taken.grid == crossword.grid and len(pool) == 0)
+
+
+def test_crossword_whose_clues_do_not_match_grid_is_discarded(tmp_path,
+                                                             dictionary):
+    """Tests that a stored crossword is discarded if a clue's word is not
+       spelled out in the grid"""
+    (word_dict, word_length_map) = dictionary
+    pool = PuzzlePool(9, 9, directory=tmp_path)
+    crossword = Crossword(9, 9, word_length_map, word_dict,
+                          user_present=False, headless=True, seed=5)
+    clue = crossword.clues_across[0]
+    crossword.grid[clue.start_row][clue.start_col] = 'q' \
+        if clue.string[0] != 'q' else 'z'
+    pool.add(crossword)
+    assert (pool.pop(word_dict, word_length_map) is None and len(pool) == 0)
+
+
+def test_generate_gives_up_when_no_crossword_is_valid(tmp_path, dictionary,
+                                                     monkeypatch):
+    """Tests that generate raises RuntimeError, rather than looping forever,
+       if every crossword it makes fails validation"""
+    (word_dict, word_length_map) = dictionary
+    pool = PuzzlePool(9, 9, directory=tmp_path)
+    attempts = []
+    monkeypatch.setattr(puzzle_pool, 'validate',
+                        lambda crossword: attempts.append(crossword) and False)
+    with pytest.raises(RuntimeError):
+        pool.generate(word_dict, word_length_map, max_attempts=3)
+    assert (len(attempts) == 3)
@@ -0,0 +1,100 @@
+from source.renderer import FrameBuffer, build_cell_cache, display_width
+from source.constants import AnsiCommands, get_large_letter
+from source.utilities import get_alternating_square_color
+
+import io
+import pytest
+
+
+@pytest.fixture
+def frame_buffer():
+    """A frame buffer with one frame of three cells already rendered"""
+    frame_buffer = FrameBuffer(io.StringIO())
+    draw_first_frame(frame_buffer)
+    frame_buffer.render()
+    return frame_buffer
+
+
+def draw_first_frame(frame_buffer):
+    frame_buffer.draw(1, 1, "ab", "<red>")
+    frame_buffer.draw(3, 1, "cd", "<red>")
+    frame_buffer.draw(1, 2, "ｅ", "<blue>")
+
+
+def test_first_frame_clears_screen_and_writes_every_cell():
+    """Tests that the first frame is written in full, in a single write"""
+    stream = io.StringIO()
+    frame_buffer = FrameBuffer(stream)
+    draw_first_frame(frame_buffer)
+    output = frame_buffer.render()
+    assert (output == stream.getvalue())
+    assert (output.startswith(AnsiCommands.CLEAR_SCREEN))
+    # The second cell follows the first, so neither the cursor nor the
+    # colours need to be set again
+    assert (output.count("<red>") == 1 and "abcd" in output)
+    assert ("\x1b[2;1H" in output and "ｅ" in output)
+
+
+def test_unchanged_frame_writes_nothing(frame_buffer):
+    """Tests that drawing the same frame again writes nothing"""
+    draw_first_frame(frame_buffer)
+    assert (frame_buffer.render() == "")
+    assert (frame_buffer.stream.getvalue().count("ab") == 1)
+
+
+def test_only_changed_cells_are_written(frame_buffer):
+    """Tests that a cell whose text or colour changed is written alone"""
+    frame_buffer.draw(1, 1, "ab", "<red>")
+    frame_buffer.draw(3, 1, "cd", "<green>")
+    frame_buffer.draw(1, 2, "ｅ", "<blue>")
+    output = frame_buffer.render()
+    reset = AnsiCommands.DEFAULT_COLOR.value
+    assert (output == f"\x1b[1;3H{reset}<green>cd{reset}")
+
+
+def test_cells_no_longer_drawn_are_erased(frame_buffer):
+    """Tests that missing cells are blanked, as are the leftover columns of
+       a cell replaced by a narrower one"""
+    frame_buffer.draw(1, 1, "a", "<red>")
+    frame_buffer.draw(3, 1, "cd", "<red>")
+    output = frame_buffer.render()
+    # The large letter on the second row takes two columns
+    assert ("\x1b[2;1H  " in output)
+    assert ("a" + AnsiCommands.DEFAULT_COLOR + " " in output)
+
+
+def test_invalidate_repaints_the_whole_frame(frame_buffer):
+    """Tests that after invalidating, every cell is written again"""
+    frame_buffer.invalidate()
+    draw_first_frame(frame_buffer)
+    output = frame_buffer.render()
+    assert (output.startswith(AnsiCommands.CLEAR_SCREEN))
+    assert ("abcd" in output and "ｅ" in output)
+
+
+def test_display_width_counts_large_letters_twice():
+    """Tests that full width characters take two columns"""
+    assert (display_width("ab") == 2)
+    assert (display_width("ａｂ") == 4)
+    assert (display_width("¹ ") == 2)
+
+
+def test_cell_cache_holds_every_square():
+    """Tests that the cell cache composes each square's colours and letter,
+       and that drawing the same cached square twice writes nothing"""
+    cells = build_cell_cache("<blank>", "<text>", "<highlight>")
+    assert (len(cells) == 2 * 2 * 28)
+    for row, col in [(0, 0), (0, 1), (3, 5), (4, 4)]:
+        parity = (row + col) % 2
+        color = get_alternating_square_color(row, col)
+        assert (cells[(parity, 'q', False)] ==
+                (color + "<text>", get_large_letter('q')))
+    assert (cells[(1, '*', True)] == ("<highlight>", "  "))
+    assert (cells[(0, '_', True)] == ("<blank>", "  "))
+    assert ((0, 'q', True) not in build_cell_cache("<blank>", "<text>"))
+
+    frame_buffer = FrameBuffer(io.StringIO())
+    for _ in range(2):
+        frame_buffer.draw_cell(1, 1, cells[(0, 'q', False)])
+        frame_buffer.render()
+    assert (frame_buffer.stream.getvalue().count(get_large_letter('q')) == 1)
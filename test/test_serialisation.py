@@ -0,0 +1,106 @@
+from source.compiled_dictionary import (CompiledDictionary,
+                                        write_compiled_dictionary)
+from source.crossword_generator import Crossword
+from source.serialisation import (HEADER, decode_crossword, encode_crossword,
+                                  read_grid, WordIds)
+from run import build_dictionary_and_length_map
+
+import pytest
+
+
+@pytest.fixture
+def dictionary():
+    """The word dictionary and word length map"""
+    return build_dictionary_and_length_map()
+
+
+def clue_details(crossword):
+    """Returns the details of every clue in a crossword, for comparison"""
+    return [(clue.string, clue.index, clue.orientation, clue.definitions,
+             clue.current_definition, clue.start_row, clue.start_col)
+            for clue in crossword.clues_across + crossword.clues_down]
+
+
+def test_decoded_crossword_matches_original(dictionary):
+    """Encodes a crossword that the user has started to solve, and checks
+       that decoding it restores the grids, clues and placement order"""
+    (word_dict, word_length_map) = dictionary
+    original = Crossword(13, 13, word_length_map, word_dict,
+                         user_present=False, headless=True, seed=8)
+    clue = original.clues_down[0]
+    original.user_guesses[clue.start_row][clue.start_col] = clue.string[0]
+    original.clues_across[1].current_definition = 1
+    original.selected_clue = clue
+
+    data = encode_crossword(original)
+    crossword = decode_crossword(data, word_dict, word_length_map,
+                                 original.word_index)
+    assert (crossword.grid == original.grid)
+    assert (crossword.user_guesses == original.user_guesses)
+    assert (crossword.letter_use == original.letter_use)
+    assert (clue_details(crossword) == clue_details(original))
+    assert (crossword.selected_clue is crossword.clues_down[0])
+    assert ([(word.string, word.start_row, word.start_col)
+             for word in crossword.placed_words] ==
+            [(word.string, word.start_row, word.start_col)
+             for word in original.placed_words])
+
+
+def test_grid_is_read_without_copying(dictionary):
+    """Tests that read_grid returns a view of the encoded data"""
+    (word_dict, word_length_map) = dictionary
+    crossword = Crossword(9, 9, word_length_map, word_dict,
+                          user_present=False, headless=True, seed=2)
+    data = bytearray(encode_crossword(crossword))
+    grid = read_grid(data)
+    assert (grid == crossword.grid)
+    grid[0][0] = 'z'
+    assert (read_grid(data)[0][0] == 'z')
+
+
+def test_crossword_from_dictionary_with_other_words_is_rejected(dictionary,
+                                                                tmp_path):
+    """Tests that a crossword cannot be decoded with a dictionary whose words
+       differ from those it was encoded with, even if the two dictionaries
+       have the same version, but can be with an identical dictionary of
+       another version"""
+    (word_dict, word_length_map) = dictionary
+    crossword = Crossword(9, 9, word_length_map, word_dict,
+                          user_present=False, headless=True, seed=2)
+    entries = {word: list(word_dict[word]) for word in word_dict}
+    write_compiled_dictionary(entries, tmp_path / "old.bin", 1)
+    write_compiled_dictionary(entries, tmp_path / "same.bin", 2)
+    entries["aaaa"] = [1, ["An extra word."]]
+    write_compiled_dictionary(entries, tmp_path / "new.bin", 1)
+
+    data = encode_crossword(crossword,
+                            WordIds(CompiledDictionary(tmp_path / "old.bin")))
+    same = CompiledDictionary(tmp_path / "same.bin")
+    decoded = decode_crossword(data, same, word_length_map,
+                               crossword.word_index)
+    assert (clue_details(decoded)[0][0] == clue_details(crossword)[0][0])
+    with pytest.raises(ValueError):
+        decode_crossword(data, CompiledDictionary(tmp_path / "new.bin"),
+                         word_length_map, crossword.word_index)
+
+
+def test_truncated_or_corrupt_crossword_is_rejected(dictionary):
+    """Tests that decoding every truncation of an encoded crossword, or one
+       whose first clue has an unknown word id, raises ValueError"""
+    (word_dict, word_length_map) = dictionary
+    crossword = Crossword(9, 9, word_length_map, word_dict,
+                          user_present=False, headless=True, seed=2)
+    crossword.user_guesses[0][0] = 'q'
+    data = encode_crossword(crossword)
+    word_ids = WordIds(word_dict)
+    for length in range(len(data)):
+        with pytest.raises(ValueError):
+            decode_crossword(data[:length], word_dict, word_length_map,
+                             crossword.word_index, word_ids)
+
+    clue_table = HEADER.size + 2 * 9 * 9
+    corrupt = bytearray(data)
+    corrupt[clue_table:clue_table + 4] = b'\xff' * 4
+    with pytest.raises(ValueError):
+        decode_crossword(corrupt, word_dict, word_length_map,
+                         crossword.word_index, word_ids)
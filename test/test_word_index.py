@@ -0,0 +1,75 @@
+from source.word_index import WordIndex
+from source.utilities import find_matches
+
+import random
+import pytest
+
+
+@pytest.fixture
+def small_dictionary():
+    """A handful of words, with frequencies, keyed by length and most
+       frequent first"""
+    word_dict = {"cat": [10, ["A feline."]],
+                 "cot": [30, ["A small bed."]],
+                 "cut": [20, ["To slice."]],
+                 "dog": [40, ["A canine."]],
+                 "crate": [5, ["A box."]]}
+    word_length_map = {3: ["dog", "cot", "cut", "cat"], 5: ["crate"]}
+    return word_dict, word_length_map
+
+
+def test_find_matches_returns_words_in_descending_frequency(small_dictionary):
+    """Tests that matches for a partial candidate are ordered by frequency"""
+    (word_dict, word_length_map) = small_dictionary
+    index = WordIndex(word_length_map, word_dict)
+    assert (index.find_matches(["c", "_", "t"]) == ["cot", "cut", "cat"])
+
+
+def test_find_matches_agrees_with_linear_scan(small_dictionary):
+    """Tests that the index gives the same answer as scanning the map"""
+    (word_dict, word_length_map) = small_dictionary
+    index = WordIndex(word_length_map, word_dict)
+    for candidate in ["___", "_o_", "c__", "__t", "d_t", "c_a_e", "____"]:
+        expected = find_matches(candidate, word_length_map, word_dict)
+        assert (index.find_matches(candidate) == expected)
+
+
+def test_repeated_pattern_is_answered_from_cache(small_dictionary):
+    """Tests that searching for the same pattern twice is a cache hit"""
+    (word_dict, word_length_map) = small_dictionary
+    index = WordIndex(word_length_map, word_dict)
+    first = index.find_matches(["_", "o", "_"])
+    second = index.find_matches("_o_")
+    assert (first == second == ["dog", "cot"])
+    assert (index.cache_hits == 1 and index.cache_hit_ratio() == 0.5)
+
+
+def test_cache_evicts_least_recently_used_pattern(small_dictionary):
+    """Tests that the cache never holds more patterns than its size"""
+    (word_dict, word_length_map) = small_dictionary
+    index = WordIndex(word_length_map, word_dict, cache_size=2)
+    for pattern in ["c__", "d__", "c__", "__t"]:
+        index.find_matches(pattern)
+    index.find_matches("d__")
+    assert (index.cache_hits == 1 and index.cache_misses == 4)
+
+
+def test_excluded_words_are_filtered_without_changing_cache(small_dictionary):
+    """Tests that excluding words leaves them available to other searches"""
+    (word_dict, word_length_map) = small_dictionary
+    index = WordIndex(word_length_map, word_dict)
+    assert (index.find_matches("c_t", exclude={"cot"}) == ["cut", "cat"])
+    assert (index.find_matches("c_t") == ["cot", "cut", "cat"])
+
+
+def test_sample_match_draws_matching_words_by_frequency(small_dictionary):
+    """Tests that sampled words match the candidate, are never excluded
+       words, and are drawn more often when they are more frequent"""
+    (word_dict, word_length_map) = small_dictionary
+    index = WordIndex(word_length_map, word_dict)
+    rng = random.Random(0)
+    draws = [index.sample_match("c_t", rng) for _ in range(600)]
+    assert (set(draws) == {"cot", "cut", "cat"})
+    assert (draws.count("cot") > draws.count("cut") > draws.count("cat"))
+    assert (index.sample_match("c_t", rng, exclude={"cot", "cut"}) == "cat")
+    assert (index.sample_match("x__", rng) is None)
@@ -1,42 +1,59 @@
-from source.crossword_validator import validate
-from source.constants import AnsiCommands
-from source.crossword_generator import Crossword
+"""
+Generates and validates a large number of crosswords, and reports the rate
+at which each validation rule is broken. Every crossword is validated, even
+after an invalid one is found, and nothing is printed until the run is
+over. Pass --output to save a csv table of every violation, with the number
+and seed of its crossword, so that failures can be reproduced.
+"""
+from source.batch import generate_batch
+from source.crossword_validator import ValidationSummary
+from run import build_dictionary_and_length_map
 
-import json
+import argparse
 import sys
 
+# The number of invalid crosswords listed in the report
+LISTED_FAILURES = 10
+
 
 def main():
     """Main entry point for the program"""
-    word_length_map = {}
-    with open('data/crossword_dictionary.json', 'r',
-              encoding='utf-8') as file:
-        word_dict = json.load(file)
-
-        # Build a python dictionary with word lengths as keys, and lists of
-        # words of that length as values. The dictionary is used to search for
-        # matching partial words
-        for word in word_dict.keys():
-            word = word.replace('\n', '')
-            length = len(word)
-            if length in word_length_map:
-                word_length_map[length].append(word)
-            else:
-                word_length_map[length] = []
-                word_length_map[length].append(word)
-
-    iterations = 100
-    for counter in range(1, iterations + 1):
-        sys.stdout.write(AnsiCommands.CLEAR_BUFFER)
-        sys.stdout.write(AnsiCommands.CLEAR_SCREEN)
-        print(f"Testing number {counter}")
-        crossword = Crossword(12, 12, word_length_map, word_dict,
-                              user_present=False)
-        result = validate(crossword)
-        if result is False:
-            print(f"problem at iteration {counter}")
-            sys.exit()
-    print(f"Tested {iterations} crosswords ... all valid")
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--count', type=int, default=100,
+                        help='the number of crosswords to generate')
+    parser.add_argument('--size', type=int, default=12,
+                        help='the number of rows and columns')
+    parser.add_argument('--seed', type=int, help='the seed of the run')
+    parser.add_argument('--output', help='write the violations to this csv')
+    args = parser.parse_args()
+
+    (word_dict, word_length_map) = build_dictionary_and_length_map()
+    summary = ValidationSummary()
+    failures = []
+    results = generate_batch(args.count, args.size, args.size, word_dict,
+                             word_length_map, seed=args.seed,
+                             keep_crosswords=False)
+    for result in results:
+        summary.add(result.number, result.seed, result.valid,
+                    result.violations)
+        if not result.valid:
+            failures.append(result)
+
+    if args.output:
+        summary.write_table(args.output)
+    if not failures:
+        print(f"Tested {args.count} crosswords ... all valid")
+        print(summary)
+        return
+
+    print(summary)
+    failures.sort(key=lambda result: result.number)
+    for result in failures[:LISTED_FAILURES]:
+        print(f"problem with crossword {result.number} "
+              f"(seed {result.seed}):")
+        for violation in result.violations:
+            print(f"  {violation}")
+    sys.exit(1)
 
 
 if __name__ == '__main__':